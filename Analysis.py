@@ -0,0 +1,204 @@
+"""
+Runs the games of a PGN archive through the engine: every position of every game is searched at a fixed budget
+and the games are written back annotated, as PGN with the engine's score and best move in a comment after every
+move, or as JSON lines. The archive is read as a stream and only a window of games is held at once, so files of
+any size can be analysed. The positions are searched by a pool of processes that stays up for the whole run and
+the games are written in the order of the archive. After every game written a checkpoint is saved next to the
+output, --resume carries on from it after an interruption.
+python Analysis.py games.pgn annotated.pgn --time 0.5 --workers 8
+"""
+import argparse
+import collections
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+import ChessEngine
+import PGN
+import SmartMoveFinder
+
+DEFAULT_DEPTH = 3 #depth searched when neither a time nor a node budget is given
+WINDOW = 16 #positions waiting in the pool per worker, the games they belong to are the ones held in memory
+CHECKPOINT_EXTENSION = ".checkpoint"
+PROGRESS_INTERVAL = 100 #games between two progress lines
+
+
+'''
+Search one position, runs in the pool. The score is in pawns from white's side.
+'''
+def analysePosition(task):
+	gameIndex, ply, fen, timeLimit, maxDepth, nodeLimit, bitboards = task
+	gs = ChessEngine.GameState(bitboards=bitboards)
+	gs.loadFEN(fen)
+	validMoves = gs.getValidMoves()
+	SmartMoveFinder.transpositionTable.clear() #every position is searched the same whatever came before it
+	random.seed("%d %d" % (gameIndex, ply))
+	start = time.perf_counter()
+	move = SmartMoveFinder.findBestMove(gs, validMoves, maxDepth, timeLimit, nodeLimit, workers=1)
+	elapsed = time.perf_counter() - start
+	return {"ply": ply, "best": gs.getSAN(move, validMoves), "score": SmartMoveFinder.bestScore * (1 if gs.whitetoMove else -1),
+			"depth": SmartMoveFinder.completedDepth, "nodes": SmartMoveFinder.nodesSearched, "time": elapsed}
+
+def initWorker(hashSizeMB):
+	SmartMoveFinder.SEARCH_WORKERS = 1
+	if hashSizeMB != SmartMoveFinder.HASH_SIZE_MB:
+		SmartMoveFinder.setHashSize(hashSizeMB)
+
+'''
+Replay a game, returning the FEN of the position before every move from fromPly on and the error that
+stopped the replay, if any
+'''
+def gamePositions(headers, moves, fromPly, bitboards):
+	gs = ChessEngine.GameState(bitboards=bitboards)
+	fens = []
+	try:
+		if "FEN" in headers:
+			gs.loadFEN(headers["FEN"])
+		for ply, move in enumerate(PGN.replayGame(gs, moves)):
+			if ply >= fromPly:
+				fens.append((ply, gs.getFEN()))
+	except ValueError as e:
+		return fens, str(e)
+	return fens, None
+
+'''
+Score of a result in pawns, white's side, as written in the comments. A mate is written as the moves to it, +M3.
+'''
+def formatScore(score):
+	if abs(score) >= SmartMoveFinder.MATE_BOUND:
+		return ("+M%d" if score > 0 else "-M%d") % max((round(SmartMoveFinder.CHECKMATE - abs(score)) + 1) // 2, 1)
+	return "%+.2f" % score
+
+'''
+The game annotated, as PGN or a JSON line
+'''
+def formatGame(index, headers, moves, result, analyses, error, outputFormat, annotator):
+	if outputFormat == "jsonl":
+		record = {"game": index + 1, "headers": headers, "result": result,
+				  "moves": [dict(analysis, move=moves[analysis["ply"]]) for analysis in analyses]}
+		if error is not None:
+			record["error"] = error
+		return json.dumps(record) + "\n"
+	comments = [None] * len(moves)
+	for analysis in analyses:
+		comments[analysis["ply"]] = "%s/%d best %s" % (formatScore(analysis["score"]), analysis["depth"], analysis["best"])
+	return PGN.formatGame(dict(headers, Annotator=annotator), moves, result, comments)
+
+def readCheckpoint(path):
+	with open(path) as f:
+		return json.load(f)
+
+'''
+Write the checkpoint as a whole or not at all, an interruption while writing it leaves the last one
+'''
+def writeCheckpoint(path, checkpoint):
+	with open(path + ".tmp", "w") as f:
+		json.dump(checkpoint, f)
+	os.replace(path + ".tmp", path)
+
+'''
+Analyse the games of the PGN file pgnPath, writing them annotated to outputPath (PGN, or JSON lines when
+outputFormat is "jsonl"). With resume the games the checkpoint says were written are skipped and the output
+is carried on from there. Returns (games, positions) analysed by this run.
+'''
+def analyseArchive(pgnPath, outputPath, timeLimit=None, maxDepth=None, nodeLimit=None, workers=1, fromPly=0, outputFormat="pgn",
+				   resume=False, bitboards=False, hashSizeMB=SmartMoveFinder.HASH_SIZE_MB, out=sys.stdout):
+	if maxDepth is None and timeLimit is None and nodeLimit is None:
+		maxDepth = DEFAULT_DEPTH
+	annotator = "BasicChessEngine " + " ".join("%s %s" % (name, value) for name, value in
+											   (("depth", maxDepth), ("time", timeLimit), ("nodes", nodeLimit)) if value is not None)
+	checkpointPath = outputPath + CHECKPOINT_EXTENSION
+	checkpoint = {"input": os.path.abspath(pgnPath), "games": 0, "positions": 0, "offset": 0}
+	if resume and os.path.exists(checkpointPath):
+		checkpoint = readCheckpoint(checkpointPath)
+		if checkpoint["input"] != os.path.abspath(pgnPath):
+			raise ValueError("the checkpoint is of another archive: " + checkpoint["input"])
+		print("resuming after %d games" % checkpoint["games"], file=out)
+	if os.path.exists(outputPath):
+		os.truncate(outputPath, checkpoint["offset"]) #drop what was written after the checkpoint
+
+	pool = None
+	if workers > 1:
+		pool = multiprocessing.get_context("spawn").Pool(workers, initializer=initWorker, initargs=(hashSizeMB,))
+	else:
+		initWorker(hashSizeMB)
+	pending = collections.deque() #games whose positions are being searched, in archive order
+	waiting = 0 #positions of the pending games
+	games = positions = 0
+	start = time.perf_counter()
+
+	'''
+	Write the oldest pending game once all its positions are searched
+	'''
+	def finishGame(output):
+		nonlocal waiting, games, positions
+		index, headers, moves, result, error, searches = pending.popleft()
+		analyses = [search.get() for search in searches] if pool is not None else searches
+		waiting -= len(searches)
+		output.write(formatGame(index, headers, moves, result, analyses, error, outputFormat, annotator).encode("utf-8"))
+		output.flush()
+		os.fsync(output.fileno())
+		games += 1
+		positions += len(analyses)
+		checkpoint["games"] = index + 1
+		checkpoint["positions"] += len(analyses)
+		checkpoint["offset"] = output.tell()
+		writeCheckpoint(checkpointPath, checkpoint)
+		if games % PROGRESS_INTERVAL == 0:
+			elapsed = time.perf_counter() - start
+			print("%d games, %d positions, %.1f positions per second" % (checkpoint["games"], checkpoint["positions"],
+					positions / elapsed if elapsed > 0 else 0), file=out)
+
+	try:
+		with open(pgnPath, encoding="utf-8", errors="replace") as f, open(outputPath, "ab") as output:
+			for index, (headers, moves, result) in enumerate(PGN.readGames(f)):
+				if index < checkpoint["games"]:
+					continue
+				fens, error = gamePositions(headers, moves, fromPly, bitboards)
+				tasks = [(index, ply, fen, timeLimit, maxDepth, nodeLimit, bitboards) for ply, fen in fens]
+				if pool is not None:
+					searches = [pool.apply_async(analysePosition, (task,)) for task in tasks]
+				else:
+					searches = [analysePosition(task) for task in tasks]
+				pending.append((index, headers, moves, result, error, searches))
+				waiting += len(searches)
+				while len(pending) > 1 and waiting > WINDOW * workers:
+					finishGame(output)
+			while pending:
+				finishGame(output)
+	finally:
+		if pool is not None:
+			pool.terminate()
+			pool.join()
+	elapsed = time.perf_counter() - start
+	print("analysed %d games, %d positions in %.2fs with %d workers, %.1f positions per second" % (games, positions, elapsed, workers,
+			positions / elapsed if elapsed > 0 else 0), file=out)
+	return games, positions
+
+def main(args=None):
+	parser = argparse.ArgumentParser(description="Annotate the games of a PGN archive with the engine's analysis.")
+	parser.add_argument("pgn", help="PGN file with the games")
+	parser.add_argument("output", help="file the annotated games are written to, JSON lines if it ends with .jsonl")
+	parser.add_argument("--time", type=float, default=None, help="seconds searched per position")
+	parser.add_argument("--depth", type=int, default=None, help="deepest iteration searched per position (default %d without a time or node budget)" % DEFAULT_DEPTH)
+	parser.add_argument("--nodes", type=int, default=None, help="nodes searched per position")
+	parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(), help="positions searched at the same time (default: one per core)")
+	parser.add_argument("--from-ply", type=int, default=0, help="plies of every game left unanalysed, the opening")
+	parser.add_argument("--format", choices=("pgn", "jsonl"), default=None, help="output format, by default from the output file name")
+	parser.add_argument("--resume", action="store_true", help="carry on from the checkpoint of an interrupted run")
+	parser.add_argument("--hash", type=int, default=SmartMoveFinder.HASH_SIZE_MB, metavar="MB", help="transposition table size per worker")
+	parser.add_argument("--bitboards", action="store_true", help="use the bitboard move generator")
+	args = parser.parse_args(args)
+	outputFormat = args.format or ("jsonl" if args.output.lower().endswith(".jsonl") else "pgn")
+	try:
+		analyseArchive(args.pgn, args.output, args.time, args.depth, args.nodes, max(args.workers, 1), args.from_ply, outputFormat,
+					   args.resume, args.bitboards, args.hash)
+	except ValueError as e:
+		print(e, file=sys.stderr)
+		return 1
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,152 @@
+"""
+Scoring positions in batches with NumPy, for the analysis jobs that score positions by the million.
+A batch is an (N, 64) int8 array holding the piece number (ChessEngine.PIECES) of every square, row*8 + col.
+The score of all its rows is one indexed lookup in the pieceSquareScores table and a sum, and is the score
+scoreBoard gives the same position, to the last bit.
+encodeFENs builds a batch straight from FEN piece placements without making a GameState, encodeChildren
+the positions after every move of a list of packed moves without making them.
+python BatchEvaluation.py positions.epd prints the score of every FEN or EPD line of a file.
+NumPy is only needed by this module, the engine itself runs without it.
+"""
+import argparse
+import sys
+import time
+import numpy
+from ChessEngine import PIECES, pieceIndex, ENPASSANT_FLAG, CASTLE_FLAG, PROMOTION_FLAG
+import SmartMoveFinder
+
+SQUARES = numpy.arange(64)
+#the FEN letter of every piece number, and the translation of a FEN piece placement into piece numbers
+fenLetters = {piece: piece[1].lower() if piece[0] == 'b' else piece[1].upper() for piece in PIECES[1:]}
+fenTranslation = {ord(letter): chr(pieceIndex[piece]) for piece, letter in fenLetters.items()}
+fenTranslation.update({ord(str(empty)): '\x00' * empty for empty in range(1, 9)})
+fenTranslation[ord('/')] = None
+pieceNumbers = set(chr(i) for i in range(len(PIECES)))
+
+
+'''
+pieceSquareScores as an array, scores in tenths of a pawn indexed by [piece number, square]
+'''
+def scoreTable():
+	return numpy.array(SmartMoveFinder.pieceSquareScores, dtype=numpy.int32)
+
+pieceSquareTable = scoreTable()
+
+'''
+The board of a GameState as a row of a batch
+'''
+def encodeBoard(board):
+	return numpy.array([pieceIndex[square] for row in board for square in row], dtype=numpy.int8)
+
+def encodeGameStates(gameStates):
+	boards = numpy.zeros((len(gameStates), 64), dtype=numpy.int8)
+	for i, gs in enumerate(gameStates):
+		boards[i] = encodeBoard(gs.board)
+	return boards
+
+'''
+Batch of the piece placements of FENs (or EPD lines, only the first field is read)
+'''
+def encodeFENs(fens):
+	placements = []
+	for fen in fens:
+		placement = fen.split(None, 1)[0].translate(fenTranslation)
+		if len(placement) != 64 or not pieceNumbers.issuperset(placement):
+			raise ValueError("bad piece placement in FEN: " + fen)
+		placements.append(placement)
+	return numpy.frombuffer("".join(placements).encode("latin-1"), dtype=numpy.int8).reshape(len(placements), 64)
+
+'''
+Batch of the positions after each of the packed moves codes in the position of gs. The moves are applied
+to copies of the board with array operations, the way makeMoveCode changes the board, gs is left as it is.
+'''
+def encodeChildren(gs, codes):
+	codes = numpy.asarray(codes, dtype=numpy.int64)
+	rows = numpy.arange(len(codes))
+	boards = numpy.tile(encodeBoard(gs.board), (len(codes), 1))
+	startSq = codes & 63
+	endSq = (codes >> 6) & 63
+	moved = (codes >> 12) & 15
+	placed = numpy.where(codes & PROMOTION_FLAG, (codes >> 23) & 15, moved)
+	boards[rows, startSq] = 0
+	enpassant = (codes & ENPASSANT_FLAG) != 0
+	boards[rows[enpassant], (startSq[enpassant] & ~7) | (endSq[enpassant] & 7)] = 0 #the pawn taken beside the one moving
+	boards[rows, endSq] = placed
+	castle = (codes & CASTLE_FLAG) != 0
+	kingSide = (endSq[castle] & 7) == 6
+	rookStart = numpy.where(kingSide, endSq[castle] + 1, endSq[castle] - 2)
+	rookEnd = numpy.where(kingSide, endSq[castle] - 1, endSq[castle] + 1)
+	boards[rows[castle], rookEnd] = boards[rows[castle], rookStart]
+	boards[rows[castle], rookStart] = 0
+	return boards
+
+'''
+Scores of a batch, positive good for white, as scoreBoard computes them: the sum of the scores in tenths
+of a pawn divided by 10. The checkmate and stalemate a GameState may be flagged with aren't on the board,
+see scoreGameStates.
+'''
+def scoreBoards(boards):
+	return pieceSquareTable[boards, SQUARES].sum(axis=1) / 10
+
+'''
+scoreBoard of every GameState, a checkmate or stalemate found by their move generation included
+'''
+def scoreGameStates(gameStates):
+	scores = scoreBoards(encodeGameStates(gameStates))
+	for i, gs in enumerate(gameStates):
+		if gs.checkMate:
+			scores[i] = -SmartMoveFinder.CHECKMATE if gs.whitetoMove else SmartMoveFinder.CHECKMATE
+		elif gs.staleMate:
+			scores[i] = SmartMoveFinder.STALEMATE
+	return scores
+
+'''
+Static scores of the positions after each of the packed moves codes, what scoreBoard gives once the move is
+made and before the move generation of the new position has looked for a mate. The search can score all
+the root children, or all the stand-pats of the quiescence searches below a node, in one call.
+'''
+def scoreChildren(gs, codes):
+	if len(codes) == 0:
+		return numpy.zeros(0)
+	return scoreBoards(encodeChildren(gs, codes))
+
+'''
+Score every FEN or EPD line of the lines, in batches of batchSize, writing "score fen" lines to out.
+Returns the number of positions scored.
+'''
+def scoreLines(lines, batchSize=65536, out=sys.stdout):
+	count = 0
+	batch = []
+	for line in lines:
+		line = line.strip()
+		if line != "" and not line.startswith("#"):
+			batch.append(line)
+		if len(batch) == batchSize:
+			count += writeScores(batch, out)
+			batch = []
+	if batch:
+		count += writeScores(batch, out)
+	return count
+
+def writeScores(fens, out):
+	for score, fen in zip(scoreBoards(encodeFENs(fens)).tolist(), fens):
+		out.write("%g %s\n" % (score, fen))
+	return len(fens)
+
+def main(args=None):
+	parser = argparse.ArgumentParser(description="Score the positions of a FEN or EPD file, one per line, with the engine's evaluation.")
+	parser.add_argument("file", help="file of FEN or EPD lines, - for stdin")
+	parser.add_argument("--batch", type=int, default=65536, help="positions scored together (default 65536)")
+	args = parser.parse_args(args)
+	start = time.perf_counter()
+	if args.file == "-":
+		count = scoreLines(sys.stdin, max(args.batch, 1))
+	else:
+		with open(args.file) as f:
+			count = scoreLines(f, max(args.batch, 1))
+	elapsed = time.perf_counter() - start
+	print("scored %d positions in %.2fs, %d per second" % (count, elapsed, count / elapsed if elapsed > 0 else 0), file=sys.stderr)
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
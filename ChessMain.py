@@ -2,6 +2,10 @@
 # Responsible for handling user input and displaying the
 # Current Game state
 
+import copy
+import os
+import queue
+import threading
 import pygame as p
 import ChessEngine,SmartMoveFinder
 
@@ -12,6 +16,8 @@ DIMENTION = 8 #Dimensions of a chess board are 8x8
 SQ_SIZE = BOARD_HEIGHT // DIMENTION
 MAX_FPS = 15 #for animations
 IMAGES = {}
+BOOK_FILE = "book.bin" #Polyglot opening book the AI plays from, if the file is there
+TABLEBASE_DIR = "tablebases" #endgame tablebases the AI looks positions up in, made with Tablebase.py
 
 '''
 Initialize a global dictionary of images.
@@ -33,6 +39,9 @@ def main():
 	clock = p.time.Clock()
 	screen.fill(p.Color("white"))
 	moveLogFont = p.font.SysFont('Arial',18,False,False)
+	if os.path.exists(BOOK_FILE):
+		SmartMoveFinder.setOpeningBook(BOOK_FILE)
+	SmartMoveFinder.setTablebasePath(TABLEBASE_DIR)
 	gs = ChessEngine.GameState()
 	validMoves = gs.getValidMoves() #This is a expensive operation
 	moveMade = False # Flag Variable
@@ -45,6 +54,9 @@ def main():
 	gameOver = False
 	playerOne = False #if human is playing white, then this will be true, if an AI is playing, then false
 	playerTwo = False #same as above but for black
+	AIThinking = False #the AI is searching in the background
+	moveFinderThread = None
+	returnQueue = None #the background search puts its move here
 	while running:
 		humanTurn = ((gs.whitetoMove and playerOne) or (not gs.whitetoMove and playerTwo))
 		for e in p.event.get():
@@ -81,12 +93,18 @@ def main():
 			# Key Handler
 			elif e.type == p.KEYDOWN:
 				if e.key == p.K_z: # Undo when 'z' is pressed
+					if AIThinking: #the search is for a position that is gone
+						cancelSearch(moveFinderThread)
+						AIThinking = False
 					gs.undoMove()
 					moveMade = True
 					animate = False
 					gameOver = False
 				
 				if e.key == p.K_r: #reset the board when 'r' is pressed
+					if AIThinking:
+						cancelSearch(moveFinderThread)
+						AIThinking = False
 					gs = ChessEngine.GameState()
 					validMoves = gs.getValidMoves()
 					sqSelected = ()
@@ -95,15 +113,27 @@ def main():
 					animate = False
 					gameOver = False
 		
-		#AI move finder logic
+		#AI move finder logic, the search runs on its own thread so the window keeps responding
 		if not gameOver and not humanTurn:
-			AImove = SmartMoveFinder.findBestMove(gs,validMoves)
-			if AImove is None:
-				print("No move found")
-				AImove = SmartMoveFinder.findRandomMove(validMoves)
-			gs.makeMove(AImove)
-			moveMade = True
-			animate = True
+			if not AIThinking:
+				AIThinking = True
+				returnQueue = queue.Queue() #new every search, a cancelled search can't hand in a stale move
+				#the search gets a copy of the game, it makes moves on it while the board is being drawn
+				moveFinderThread = threading.Thread(target=findMoveInBackground,args=(copy.deepcopy(gs),list(validMoves),returnQueue),daemon=True)
+				moveFinderThread.start()
+			else:
+				try:
+					AImove = returnQueue.get_nowait()
+				except queue.Empty:
+					pass #still thinking, come back next frame
+				else:
+					if AImove is None:
+						print("No move found")
+						AImove = SmartMoveFinder.findRandomMove(validMoves)
+					gs.makeMove(AImove)
+					moveMade = True
+					animate = True
+					AIThinking = False
 
 		if moveMade:
 			if len(gs.moveLog) > 0 and animate:
@@ -127,6 +157,23 @@ def main():
 		p.display.flip()
 
 
+'''
+Runs on the move finder thread, hands the move found back through the queue
+'''
+def findMoveInBackground(gs,validMoves,returnQueue):
+	returnQueue.put(SmartMoveFinder.findBestMove(gs,validMoves))
+
+'''
+Stop the background search and wait for its thread to end, so that the next search doesn't run
+alongside it in SmartMoveFinder. Stopping is asked for again until it ends, in case the search had
+not started yet when first asked.
+'''
+def cancelSearch(moveFinderThread):
+	while moveFinderThread.is_alive():
+		SmartMoveFinder.stopSearch()
+		moveFinderThread.join(0.01)
+
+
 #Draws the square. The top left square is always light (from both black and white perspective)
 def drawBoard(screen):
 	global colors
@@ -0,0 +1,150 @@
+"""
+Runs an EPD test suite: every position is searched for a fixed time and the move found is checked against
+the bm (best move) and am (avoid move) operations of the position. Positions are spread over a pool of
+processes, the solve rate and the time taken are printed at the end.
+python EPD.py suite.epd --time 1 --workers 4
+"""
+import argparse
+import multiprocessing
+import shlex
+import sys
+import time
+import ChessEngine
+import SmartMoveFinder
+
+DEFAULT_TIME = 1.0 #seconds searched per position
+
+
+'''
+Split an EPD line into a FEN and a dict of its operations, opcode -> list of operands. The move counters
+are taken from the hmvc and fmvn operations if there are any. Returns None for blank and comment lines.
+'''
+def parseEPD(line):
+	line = line.strip()
+	if line == "" or line.startswith("#"):
+		return None
+	fields = line.split(None, 4)
+	if len(fields) < 4:
+		raise ValueError("EPD needs at least 4 fields: " + line)
+	operations = {}
+	for operation in splitOperations(fields[4] if len(fields) > 4 else ""):
+		tokens = shlex.split(operation)
+		if len(tokens) > 0:
+			operations[tokens[0]] = tokens[1:]
+	halfmoveClock = operations.get("hmvc", ["0"])[0]
+	fullmoveNumber = operations.get("fmvn", ["1"])[0]
+	return " ".join(fields[:4] + [halfmoveClock, fullmoveNumber]), operations
+
+'''
+The operations of an EPD line are separated by semicolons, which may also appear inside quoted strings
+'''
+def splitOperations(text):
+	operations = []
+	current = ""
+	quoted = False
+	for char in text:
+		if char == '"':
+			quoted = not quoted
+		if char == ';' and not quoted:
+			operations.append(current.strip())
+			current = ""
+		else:
+			current += char
+	if current.strip() != "":
+		operations.append(current.strip())
+	return operations
+
+'''
+Search one position, runs in the pool. Returns a dict with what was found and whether it solves the position.
+A bm or am move that isn't a valid move of the position makes it invalid: it is listed under "invalid" and the
+position isn't searched, it would be scored against the wrong moves.
+'''
+def solvePosition(task):
+	index, fen, operations, timeLimit, maxDepth, bitboards = task
+	gs = ChessEngine.GameState(bitboards=bitboards)
+	gs.loadFEN(fen)
+	validMoves = gs.getValidMoves()
+	bestMoves = [gs.parseSAN(san, validMoves) for san in operations.get("bm", [])]
+	avoidMoves = [gs.parseSAN(san, validMoves) for san in operations.get("am", [])]
+	result = {"index": index, "id": " ".join(operations.get("id", [])) or str(index + 1), "fen": fen,
+			  "bm": operations.get("bm", []), "am": operations.get("am", [])}
+	invalid = [san for san, move in zip(result["bm"] + result["am"], bestMoves + avoidMoves) if move is None]
+	if invalid:
+		result.update(move="-", invalid=invalid, solved=False, depth=0, nodes=0, time=0.0)
+		return result
+	SmartMoveFinder.transpositionTable.clear() #every position is searched the same whatever came before it
+
+	start = time.perf_counter()
+	move = SmartMoveFinder.findBestMove(gs, validMoves, maxDepth, timeLimit)
+	elapsed = time.perf_counter() - start
+	solved = move is not None and (len(bestMoves) == 0 or move in bestMoves) and move not in avoidMoves
+	result.update(move=gs.getSAN(move) if move is not None else "-", solved=solved,
+				  depth=SmartMoveFinder.completedDepth, nodes=SmartMoveFinder.nodesSearched, time=elapsed)
+	return result
+
+def initWorker(hashSizeMB):
+	if hashSizeMB != SmartMoveFinder.HASH_SIZE_MB:
+		SmartMoveFinder.setHashSize(hashSizeMB)
+
+'''
+Run every position of the EPD lines, printing a line per position as the results come in (in file order)
+and a summary. Invalid positions are counted apart from the solved and missed ones. Returns the list of result dicts.
+'''
+def runSuite(lines, timeLimit=DEFAULT_TIME, maxDepth=None, workers=1, bitboards=False, hashSizeMB=SmartMoveFinder.HASH_SIZE_MB, out=sys.stdout):
+	tasks = []
+	for line in lines:
+		parsed = parseEPD(line)
+		if parsed is not None:
+			tasks.append((len(tasks), parsed[0], parsed[1], timeLimit, maxDepth, bitboards))
+
+	start = time.perf_counter()
+	results = []
+	pool = None
+	if workers > 1:
+		pool = multiprocessing.get_context("spawn").Pool(workers, initializer=initWorker, initargs=(hashSizeMB,))
+		solved = pool.imap(solvePosition, tasks)
+	else:
+		initWorker(hashSizeMB)
+		solved = map(solvePosition, tasks)
+	try:
+		for result in solved:
+			results.append(result)
+			expected = ("bm " + " ".join(result["bm"]) if result["bm"] else "") + (" am " + " ".join(result["am"]) if result["am"] else "")
+			if "invalid" in result:
+				print("%-16s %-8s %-24s invalid  no such move: %s" % (result["id"], result["move"], expected.strip(), " ".join(result["invalid"])), file=out)
+				continue
+			print("%-16s %-8s %-24s %s depth %2d %9d nodes %6.2fs" % (result["id"], result["move"], expected.strip(),
+					"solved  " if result["solved"] else "missed  ", result["depth"], result["nodes"], result["time"]), file=out)
+	finally:
+		if pool is not None:
+			pool.terminate()
+			pool.join()
+	elapsed = time.perf_counter() - start
+
+	solvedCount = sum(1 for result in results if result["solved"])
+	invalidCount = sum(1 for result in results if "invalid" in result)
+	searched = len(results) - invalidCount
+	nodes = sum(result["nodes"] for result in results)
+	searchTime = sum(result["time"] for result in results)
+	print("solved %d of %d (%.1f%%) in %.2fs with %d workers, %d nodes, %d nps per worker" % (solvedCount, searched,
+			100 * solvedCount / searched if searched else 0, elapsed, workers, nodes, nodes / searchTime if searchTime > 0 else 0), file=out)
+	if invalidCount:
+		print("%d invalid positions not searched, their bm or am moves aren't valid moves" % invalidCount, file=out)
+	return results
+
+def main(args=None):
+	parser = argparse.ArgumentParser(description="Run an EPD test suite and report how many positions the engine solves.")
+	parser.add_argument("file", help="EPD file, one position per line with bm and/or am operations")
+	parser.add_argument("--time", type=float, default=DEFAULT_TIME, help="seconds per position (default %g)" % DEFAULT_TIME)
+	parser.add_argument("--depth", type=int, default=None, help="deepest iteration searched, no limit by default")
+	parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(), help="positions searched at the same time (default: one per core)")
+	parser.add_argument("--hash", type=int, default=SmartMoveFinder.HASH_SIZE_MB, metavar="MB", help="transposition table size per worker")
+	parser.add_argument("--bitboards", action="store_true", help="use the bitboard move generator")
+	args = parser.parse_args(args)
+	with open(args.file) as f:
+		lines = f.readlines()
+	runSuite(lines, args.time, args.depth, max(args.workers, 1), args.bitboards, args.hash)
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,349 @@
+"""
+Plays two configurations of the engine against each other, to tell whether a change costs playing strength.
+A configuration is a string of key=value settings: depth, time (seconds per move), nodes, hash (MB), bitboards
+and name, and any upper case module setting of SmartMoveFinder, e.g. "depth=3 MAX_QUIESCENCE_PLY=8".
+Every opening is played twice, each configuration having white once. The games are spread over a pool of
+processes and the match stops as soon as the SPRT (sequential probability ratio test) accepts either of its
+hypotheses: that the first configuration is elo0 Elo stronger than the second or that it is elo1 Elo stronger.
+python Match.py "depth=3" "depth=2" --games 200 --workers 4 --pgn games.pgn
+"""
+import argparse
+import math
+import multiprocessing
+import random
+import sys
+import time
+import ChessEngine
+import EPD
+import PGN
+import SmartMoveFinder
+
+DEFAULT_GAMES = 1000 #most games played when the SPRT doesn't stop the match before
+MAX_PLIES = 400 #a game still going after this many plies is adjudicated a draw
+OPENING_PLIES = 8 #plies of the games of a PGN openings file that are played as the opening
+ELO0 = 0.0
+ELO1 = 10.0
+ALPHA = 0.05 #chance of accepting H1 when H0 is true
+BETA = 0.05 #chance of accepting H0 when H1 is true
+
+#balanced openings, in SAN from the initial position, used when no openings file is given
+OPENINGS = ["e4 e5 Nf3 Nc6 Bb5 a6",
+			"e4 e5 Nf3 Nc6 Bc4 Bc5",
+			"e4 e5 Nf3 Nf6 Nxe5 d6 Nf3 Nxe4",
+			"e4 c5 Nf3 d6 d4 cxd4 Nxd4 Nf6 Nc3",
+			"e4 c5 Nc3 Nc6 g3 g6 Bg2 Bg7",
+			"e4 e6 d4 d5 Nc3 Nf6",
+			"e4 c6 d4 d5 e5 Bf5",
+			"e4 d5 exd5 Qxd5 Nc3 Qa5",
+			"d4 d5 c4 e6 Nc3 Nf6",
+			"d4 d5 c4 c6 Nf3 Nf6",
+			"d4 Nf6 c4 g6 Nc3 Bg7 e4 d6",
+			"d4 Nf6 c4 e6 Nc3 Bb4",
+			"d4 Nf6 c4 e6 g3 d5 Bg2 Be7",
+			"d4 d5 Bf4 Nf6 e3 e6",
+			"c4 e5 Nc3 Nf6 Nf3 Nc6",
+			"Nf3 d5 g3 Nf6 Bg2 c6"]
+
+def parseBool(value):
+	if value.lower() in ("true", "1", "yes", "on"):
+		return True
+	if value.lower() in ("false", "0", "no", "off"):
+		return False
+	raise ValueError("not a boolean: " + value)
+
+ENGINE_SETTINGS = {"name": str, "depth": int, "time": float, "nodes": int, "hash": int, "bitboards": parseBool}
+
+
+'''
+The configuration a settings string describes, as a dict. Module settings of SmartMoveFinder go in its
+options and are converted to the type they have there. With no depth, time or node limit the engine
+searches to SmartMoveFinder.DEPTH.
+'''
+def parseEngine(spec, name):
+	engine = {"name": name, "depth": None, "time": None, "nodes": None, "hash": SmartMoveFinder.HASH_SIZE_MB,
+			  "bitboards": False, "options": {}}
+	for token in spec.split():
+		if "=" not in token:
+			raise ValueError("engine settings are written key=value: " + token)
+		key, value = token.split("=", 1)
+		if key in ENGINE_SETTINGS:
+			engine[key] = ENGINE_SETTINGS[key](value)
+		elif key.isupper() and hasattr(SmartMoveFinder, key):
+			default = getattr(SmartMoveFinder, key)
+			if isinstance(default, bool):
+				engine["options"][key] = parseBool(value)
+			elif isinstance(default, (int, float)):
+				engine["options"][key] = type(default)(value)
+			else:
+				raise ValueError(key + " can't be set from a match")
+		else:
+			raise ValueError("unknown engine setting " + key)
+	if engine["depth"] is None and engine["time"] is None and engine["nodes"] is None:
+		engine["depth"] = SmartMoveFinder.DEPTH
+	return engine
+
+'''
+Openings as (FEN or None for the initial position, SAN moves) from a file: the first plies of the games of
+a PGN file, or the positions of a FEN/EPD file, one per line
+'''
+def readOpenings(path, plies=OPENING_PLIES):
+	openings = []
+	with open(path, encoding="utf-8", errors="replace") as f:
+		if path.lower().endswith(".pgn"):
+			for headers, moves, result in PGN.readGames(f):
+				openings.append((headers.get("FEN"), moves[:plies]))
+		else:
+			for line in f:
+				parsed = EPD.parseEPD(line)
+				if parsed is not None:
+					openings.append((parsed[0], []))
+	return openings
+
+#state of the process playing games
+transpositionTables = {} #name -> the TranspositionTable of each configuration
+optionDefaults = {} #SmartMoveFinder settings as they were before a configuration changed them
+
+'''
+Set SmartMoveFinder up to search as the configuration engine, with its own transposition table
+'''
+def useEngine(engine):
+	for name, value in optionDefaults.items():
+		setattr(SmartMoveFinder, name, engine["options"].get(name, value))
+	SmartMoveFinder.transpositionTable = transpositionTables[engine["name"]]
+
+'''
+The result of the game as (result, termination) if it is over in the position of gs, whose valid moves
+are validMoves, else (None, None)
+'''
+def adjudicate(gs, validMoves, plies, maxPlies):
+	if len(validMoves) == 0:
+		if gs.checkMate:
+			return ("0-1" if gs.whitetoMove else "1-0"), "checkmate"
+		return "1/2-1/2", "stalemate"
+	if gs.halfmoveClock >= 100:
+		return "1/2-1/2", "fifty move rule"
+	if gs.zobristKeyLog.count(gs.zobristKey) >= 3:
+		return "1/2-1/2", "threefold repetition"
+	if insufficientMaterial(gs.board):
+		return "1/2-1/2", "insufficient material"
+	if plies >= maxPlies:
+		return "1/2-1/2", "adjudication"
+	return None, None
+
+'''
+Only the kings are left, or the kings and one knight or bishop
+'''
+def insufficientMaterial(board):
+	pieces = [square for row in board for square in row if square != "--" and square[1] != 'K']
+	return len(pieces) == 0 or (len(pieces) == 1 and pieces[0][1] in "NB")
+
+'''
+Play one game, runs in the pool. Returns a dict with the moves, the result and the nodes searched and
+search time of each configuration.
+'''
+def playGame(task):
+	index, (fen, opening), white, black, maxPlies = task
+	random.seed(index) #the move order shuffles of the search, so that a match can be played again
+	engines = (white, black)
+	for engine in engines:
+		for name in engine["options"]:
+			optionDefaults.setdefault(name, getattr(SmartMoveFinder, name))
+		if engine["name"] not in transpositionTables:
+			transpositionTables[engine["name"]] = SmartMoveFinder.TranspositionTable(engine["hash"])
+		transpositionTables[engine["name"]].clear()
+	#one GameState per configuration, they may not use the same move generator
+	states = []
+	for engine in engines:
+		gs = ChessEngine.GameState(bitboards=engine["bitboards"])
+		if fen is not None:
+			gs.loadFEN(fen)
+		for move in PGN.replayGame(gs, opening):
+			pass
+		states.append(gs)
+	moves = list(opening)
+	nodes = {white["name"]: 0, black["name"]: 0}
+	searchTime = {white["name"]: 0.0, black["name"]: 0.0}
+	moduleTable = SmartMoveFinder.transpositionTable
+	try:
+		while True:
+			side = 0 if states[0].whitetoMove else 1
+			engine = engines[side]
+			gs = states[side]
+			validMoves = gs.getValidMoves()
+			result, termination = adjudicate(gs, validMoves, len(moves) - len(opening), maxPlies)
+			if result is not None:
+				break
+			useEngine(engine)
+			start = time.perf_counter()
+			move = SmartMoveFinder.findBestMove(gs, validMoves, engine["depth"], engine["time"], engine["nodes"], workers=1)
+			searchTime[engine["name"]] += time.perf_counter() - start
+			nodes[engine["name"]] += SmartMoveFinder.nodesSearched
+			moves.append(gs.getSAN(move, validMoves))
+			for state in states:
+				state.makeMoveCode(move.code)
+	finally: #back to the module settings
+		for name, value in optionDefaults.items():
+			setattr(SmartMoveFinder, name, value)
+		SmartMoveFinder.transpositionTable = moduleTable
+	return {"index": index, "white": white["name"], "black": black["name"], "fen": fen, "moves": moves, "result": result,
+			"termination": termination, "nodes": nodes, "time": searchTime}
+
+'''
+Expected score of a player the given number of Elo stronger than its opponent
+'''
+def expectedScore(elo):
+	return 1 / (1 + 10 ** (-elo / 400))
+
+'''
+Score and its variance per game of wins, draws and losses
+'''
+def scoreVariance(wins, draws, losses):
+	games = wins + draws + losses
+	score = (wins + draws / 2) / games
+	variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+	return score, variance
+
+'''
+Log likelihood ratio of H1 (elo1 stronger) against H0 (elo0 stronger) after the games, with the normal
+approximation of the generalized SPRT
+'''
+def sprtLLR(wins, draws, losses, elo0, elo1):
+	games = wins + draws + losses
+	if games == 0:
+		return 0.0
+	score, variance = scoreVariance(wins, draws, losses)
+	if variance == 0:
+		return 0.0
+	score0 = expectedScore(elo0)
+	score1 = expectedScore(elo1)
+	return games * (score1 - score0) * (2 * score - score0 - score1) / (2 * variance)
+
+'''
+LLR bounds (lower, upper): H0 is accepted below the lower one, H1 above the upper one
+'''
+def sprtBounds(alpha, beta):
+	return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+'''
+Elo difference the score stands for and its 95% confidence margin, (elo, margin)
+'''
+def eloEstimate(wins, draws, losses):
+	games = wins + draws + losses
+	if games == 0:
+		return 0.0, 0.0
+	score, variance = scoreVariance(wins, draws, losses)
+	deviation = 1.96 * math.sqrt(variance / games)
+	def elo(score):
+		score = min(max(score, 1e-6), 1 - 1e-6)
+		return -400 * math.log10(1 / score - 1)
+	return elo(score), (elo(score + deviation) - elo(score - deviation)) / 2
+
+def initWorker():
+	SmartMoveFinder.SEARCH_WORKERS = 1
+
+'''
+Play the match of first against second (configuration dicts, see parseEngine), printing a line per game and
+a summary to out and writing the games to pgnPath if given. Returns a dict with the outcome.
+'''
+def runMatch(first, second, games=DEFAULT_GAMES, openings=None, workers=1, maxPlies=MAX_PLIES, elo0=ELO0, elo1=ELO1,
+			 alpha=ALPHA, beta=BETA, pgnPath=None, out=sys.stdout):
+	if first["name"] == second["name"]:
+		raise ValueError("the configurations need different names")
+	if openings is None:
+		openings = [(None, opening.split()) for opening in OPENINGS]
+	if len(openings) == 0:
+		raise ValueError("no openings to play")
+	tasks = []
+	for index in range(games):
+		opening = openings[index // 2 % len(openings)]
+		white, black = (first, second) if index % 2 == 0 else (second, first)
+		tasks.append((index, opening, white, black, maxPlies))
+
+	lower, upper = sprtBounds(alpha, beta)
+	wins = draws = losses = 0 #of the first configuration
+	llr = 0.0
+	decision = "inconclusive"
+	nodes = {first["name"]: 0, second["name"]: 0}
+	searchTime = {first["name"]: 0.0, second["name"]: 0.0}
+	played = 0
+	pgn = open(pgnPath, "w") if pgnPath is not None else None
+	start = time.perf_counter()
+	pool = None
+	if workers > 1:
+		pool = multiprocessing.get_context("spawn").Pool(workers, initializer=initWorker)
+		finished = pool.imap_unordered(playGame, tasks)
+	else:
+		finished = map(playGame, tasks)
+	try:
+		for game in finished:
+			played += 1
+			for name in nodes:
+				nodes[name] += game["nodes"][name]
+				searchTime[name] += game["time"][name]
+			if game["result"] == "1/2-1/2":
+				draws += 1
+			elif (game["result"] == "1-0") == (game["white"] == first["name"]):
+				wins += 1
+			else:
+				losses += 1
+			llr = sprtLLR(wins, draws, losses, elo0, elo1)
+			print("game %4d %s - %s %-7s %-21s +%d -%d =%d LLR %.2f [%.2f, %.2f]" % (game["index"] + 1, game["white"], game["black"],
+					game["result"], game["termination"], wins, losses, draws, llr, lower, upper), file=out)
+			if pgn is not None:
+				headers = {"Event": first["name"] + " vs " + second["name"], "Site": "Match.py", "Date": time.strftime("%Y.%m.%d"),
+						   "Round": str(game["index"] + 1), "White": game["white"], "Black": game["black"]}
+				if game["fen"] is not None:
+					headers["SetUp"] = "1"
+					headers["FEN"] = game["fen"]
+				headers["Termination"] = game["termination"]
+				pgn.write(PGN.formatGame(headers, game["moves"], game["result"]))
+			if llr >= upper:
+				decision = "H1 accepted"
+				break
+			if llr <= lower:
+				decision = "H0 accepted"
+				break
+	finally:
+		if pool is not None:
+			pool.terminate()
+			pool.join()
+		if pgn is not None:
+			pgn.close()
+	elapsed = time.perf_counter() - start
+
+	elo, margin = eloEstimate(wins, draws, losses)
+	nps = {name: nodes[name] / searchTime[name] if searchTime[name] > 0 else 0 for name in nodes}
+	print("%s vs %s: +%d -%d =%d in %d games, Elo %.1f +- %.1f" % (first["name"], second["name"], wins, losses, draws, played, elo, margin), file=out)
+	print("SPRT elo0 %g elo1 %g: LLR %.2f [%.2f, %.2f], %s" % (elo0, elo1, llr, lower, upper, decision), file=out)
+	print("%.2fs, %.3f games per second with %d workers, %s %d nps, %s %d nps" % (elapsed, played / elapsed if elapsed > 0 else 0, workers,
+			first["name"], nps[first["name"]], second["name"], nps[second["name"]]), file=out)
+	return {"games": played, "wins": wins, "draws": draws, "losses": losses, "elo": elo, "margin": margin, "llr": llr,
+			"decision": decision, "time": elapsed, "nps": nps}
+
+def main(args=None):
+	parser = argparse.ArgumentParser(description="Play two configurations of the engine against each other until the SPRT decides.")
+	parser.add_argument("first", help='settings of the first configuration, e.g. "depth=3" or "time=0.1 DELTA_MARGIN=0"')
+	parser.add_argument("second", help="settings of the second configuration")
+	parser.add_argument("--games", type=int, default=DEFAULT_GAMES, help="most games played (default %d)" % DEFAULT_GAMES)
+	parser.add_argument("--openings", help="PGN file whose games start the openings, or FEN/EPD file of starting positions")
+	parser.add_argument("--opening-plies", type=int, default=OPENING_PLIES, help="plies of the PGN games played as the opening (default %d)" % OPENING_PLIES)
+	parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(), help="games played at the same time (default: one per core)")
+	parser.add_argument("--max-plies", type=int, default=MAX_PLIES, help="plies after which a game is a draw (default %d)" % MAX_PLIES)
+	parser.add_argument("--elo0", type=float, default=ELO0, help="Elo difference of H0 (default %g)" % ELO0)
+	parser.add_argument("--elo1", type=float, default=ELO1, help="Elo difference of H1 (default %g)" % ELO1)
+	parser.add_argument("--alpha", type=float, default=ALPHA, help="false positive rate (default %g)" % ALPHA)
+	parser.add_argument("--beta", type=float, default=BETA, help="false negative rate (default %g)" % BETA)
+	parser.add_argument("--pgn", help="file the games are written to")
+	args = parser.parse_args(args)
+	try:
+		first = parseEngine(args.first, "first")
+		second = parseEngine(args.second, "second")
+	except ValueError as e:
+		parser.error(str(e))
+	openings = readOpenings(args.openings, args.opening_plies) if args.openings is not None else None
+	runMatch(first, second, args.games, openings, max(args.workers, 1), args.max_plies, args.elo0, args.elo1,
+			 args.alpha, args.beta, args.pgn)
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,109 @@
+"""
+Reading and writing games in PGN. readGames is a generator, it only holds the game being read in memory,
+so it can go through corpora of any size. formatGame writes a game back as PGN text.
+"""
+import re
+
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+headerPattern = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+#comments, variations are removed separately since they nest
+tokenPattern = re.compile(r'\{[^}]*\}|;[^\n]*|\$\d+|\(|\)|[^\s(){};]+')
+moveNumberPattern = re.compile(r'^\d+\.*$')
+LINE_LENGTH = 79 #longest movetext line written, the standard asks for less than 80
+SEVEN_TAG_ROSTER = ("Event", "Site", "Date", "Round", "White", "Black", "Result")
+
+
+'''
+Yields (headers, moves, result) for every game of an open PGN file: headers is a dict of the tag pairs,
+moves the mainline in SAN (comments, variations, NAGs and move numbers removed) and result the game
+termination marker, or the Result tag if the movetext has none.
+'''
+def readGames(f):
+	headers = {}
+	movetext = []
+	for line in f:
+		stripped = line.strip()
+		if stripped.startswith("[") and movetext:
+			#a tag after movetext starts the next game
+			yield parseGame(headers, movetext)
+			headers = {}
+			movetext = []
+		if stripped.startswith("["):
+			match = headerPattern.match(stripped)
+			if match:
+				headers[match.group(1)] = match.group(2).replace('\\"', '"').replace('\\\\', '\\')
+		elif stripped != "" and not stripped.startswith("%"): #% lines are escaped, for other programs
+			movetext.append(line)
+	if headers or movetext:
+		yield parseGame(headers, movetext)
+
+def parseGame(headers, movetext):
+	moves = []
+	result = headers.get("Result", "*")
+	depth = 0 #nesting of variations
+	for token in tokenPattern.findall("".join(movetext)):
+		if token == "(":
+			depth += 1
+		elif token == ")":
+			depth = max(depth - 1, 0)
+		elif depth > 0 or token[0] in "{;$" or moveNumberPattern.match(token):
+			continue
+		elif token in RESULTS:
+			result = token
+		else:
+			#a move number written against the move, as in 12.Nf3 or 12...Nf6
+			moves.append(token.split(".")[-1] if "." in token else token)
+	return headers, moves, result
+
+'''
+Replay the SAN moves of a game on a GameState, yielding every Move before it is made. Stops with a
+ValueError at a move that isn't valid in the position.
+'''
+def replayGame(gs, moves):
+	for san in moves:
+		move = gs.parseSAN(san)
+		if move is None:
+			raise ValueError("invalid move " + san + " in position " + gs.getFEN())
+		yield move
+		gs.makeMove(move)
+
+'''
+PGN text of a game: the tag pairs of headers (the seven tag roster first, "?" for the ones missing) and the SAN
+moves numbered from the FEN tag if there is one, ending with the result and a blank line. comments, if given,
+has a comment (or None) for every move, written in braces after it.
+'''
+def formatGame(headers, moves, result, comments=None):
+	headers = dict(headers, Result=result)
+	tags = list(SEVEN_TAG_ROSTER) + [name for name in headers if name not in SEVEN_TAG_ROSTER]
+	lines = ['[%s "%s"]' % (name, headers.get(name, "?").replace('\\', '\\\\').replace('"', '\\"')) for name in tags]
+	whiteToMove = True
+	number = 1
+	if "FEN" in headers:
+		fields = headers["FEN"].split()
+		whiteToMove = len(fields) < 2 or fields[1] != 'b'
+		number = int(fields[5]) if len(fields) > 5 and fields[5].isdigit() else 1
+	tokens = []
+	commented = False #black's move is numbered again after a comment
+	for i, san in enumerate(moves):
+		if whiteToMove:
+			tokens.append("%d." % number)
+		elif i == 0 or commented:
+			tokens.append("%d..." % number)
+		tokens.append(san)
+		commented = comments is not None and i < len(comments) and comments[i] is not None
+		if commented:
+			tokens.append("{" + comments[i].replace("}", ")") + "}")
+		if not whiteToMove:
+			number += 1
+		whiteToMove = not whiteToMove
+	tokens.append(result)
+	lines.append("")
+	line = ""
+	for token in tokens:
+		if line and len(line) + 1 + len(token) > LINE_LENGTH:
+			lines.append(line)
+			line = token
+		else:
+			line = line + " " + token if line else token
+	lines.append(line)
+	return "\n".join(lines) + "\n\n"
@@ -0,0 +1,167 @@
+"""
+Perft counts the leaf nodes of the move generation tree to a fixed depth. The counts are compared with
+known numbers to check getValidMoves, makeMove and undoMove, and timed to measure how fast they are.
+python Perft.py runs the standard position set, python Perft.py --fen "<fen>" --depth 4 --divide
+counts a single position and prints the count under every root move.
+"""
+import argparse
+import sys
+import time
+from array import array
+import ChessEngine
+
+STARTPOS = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+'''
+Standard perft positions with their node counts at depth 1, 2, 3...
+The engine always promotes to a queen, so only queen promotions are counted. The numbers are the usual
+published ones wherever no pawn can promote within the depth, e.g. startpos and position3.
+'''
+PERFT_POSITIONS = [
+	("startpos", STARTPOS, [20, 400, 8902, 197281]),
+	("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", [48, 2039, 97862, 4074224]),
+	("position3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", [14, 191, 2812, 43238, 674624]),
+	("position4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", [6, 228, 8087, 320802]),
+	("position4 mirrored", "r2q1rk1/pP1p2pp/Q4n2/bbp1p3/Np6/1B3NBn/pPPP1PPP/R3K2R b KQ - 0 1", [6, 228, 8087, 320802]),
+	("position5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", [41, 1373, 54007, 1806790]),
+	("position6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10", [46, 2079, 89890, 3894594]),
+	("illegal en-passant 1", "3k4/3p4/8/K1P4r/8/8/8/8 b - - 0 1", [18, 92, 1670, 10138, 185429, 1132035]),
+	("illegal en-passant 2", "8/8/4k3/8/2p5/8/B2P2K1/8 w - - 0 1", [13, 102, 1266, 10276, 135655, 1013750]),
+	("en-passant capture checks opponent", "8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1", [15, 126, 1928, 13931, 206136]),
+	("short castling gives check", "5k2/8/8/8/8/8/8/4K2R w K - 0 1", [15, 66, 1198, 6399, 120330, 661072]),
+	("long castling gives check", "3k4/8/8/8/8/8/8/R3K3 w Q - 0 1", [16, 71, 1286, 7418, 141077, 803711]),
+	("castle rights", "r3k2r/1b4bq/8/8/8/8/7B/R3K2R w KQkq - 0 1", [26, 1141, 27826, 1274206]),
+	("castling prevented", "r3k2r/8/3Q4/8/8/5q2/8/R3K2R b KQkq - 0 1", [44, 1494, 50509, 1720476]),
+	("promote out of check", "2K2r2/4P3/8/8/8/8/8/3k4 w - - 0 1", [5, 75, 694, 9674, 128641, 1783549]),
+	("discovered check", "8/8/1P2K3/8/2n5/1q6/8/5k2 b - - 0 1", [29, 165, 5160, 30674, 963213]),
+	("promote to give check", "4k3/1P6/8/8/8/8/K7/8 w - - 0 1", [6, 28, 248, 1379, 18382, 96431, 1801163]),
+	("self stalemate", "K1k5/8/P7/8/8/8/8/8 w - - 0 1", [2, 6, 13, 63, 331, 1924, 11175]),
+	("stalemate and checkmate 1", "8/k1P5/8/1K6/8/8/8/8 w - - 0 1", [7, 19, 129, 498, 4217, 18519, 188160]),
+	("stalemate and checkmate 2", "8/8/2k5/5q2/5n2/8/5K2/8 b - - 0 1", [37, 183, 6559, 23527, 811573]),
+]
+
+SUITE_MAX_NODES = 250000 #the suite runs each position to the deepest depth with at most this many nodes
+
+
+'''
+Fixed size table of subtree counts, indexed by the zobrist key and the remaining depth.
+A slot keeps the full key and a word with the count and the depth, newer entries always replace older ones.
+'''
+class PerftCache():
+	ENTRY_SIZE = 16 #bytes per slot: 8 for the key, 8 for the packed count and depth
+
+	def __init__(self, sizeMB=16):
+		entries = 1 << (max(1, sizeMB*1024*1024 // self.ENTRY_SIZE).bit_length() - 1) #round down to a power of 2
+		self.mask = entries - 1
+		self.keys = array('Q', [0]) * entries
+		self.data = array('Q', [0]) * entries
+		self.hits = 0
+
+	def probe(self, key, depth):
+		i = (key ^ depth) & self.mask
+		data = self.data[i]
+		if self.keys[i] == key and data & 0xFF == depth:
+			self.hits += 1
+			return data >> 8
+		return None
+
+	def store(self, key, depth, nodes):
+		i = (key ^ depth) & self.mask
+		self.keys[i] = key
+		self.data[i] = nodes << 8 | depth
+
+
+'''
+Number of leaf nodes depth plies below the position. The last ply isn't made, its moves are just counted.
+'''
+def perft(gs, depth, cache=None):
+	if depth == 0:
+		return 1
+	if cache is not None and depth > 1: #depth 1 is cheaper to count than to look up
+		nodes = cache.probe(gs.zobristKey, depth)
+		if nodes is not None:
+			return nodes
+	moves = gs.getValidMoveCodes()
+	if depth == 1:
+		return len(moves)
+	nodes = 0
+	for move in moves:
+		gs.makeMoveCode(move)
+		nodes += perft(gs, depth-1, cache)
+		gs.undoMove()
+	if cache is not None:
+		cache.store(gs.zobristKey, depth, nodes)
+	return nodes
+
+'''
+Perft split by root move, returns a list of (move, nodes) with the move in coordinate notation
+'''
+def divide(gs, depth, cache=None):
+	results = []
+	for move in gs.getValidMoves():
+		gs.makeMove(move)
+		results.append((move.getChessNotation(), perft(gs, depth-1, cache)))
+		gs.undoMove()
+	return results
+
+def newGameState(fen, bitboards=False):
+	gs = ChessEngine.GameState(bitboards=bitboards)
+	gs.loadFEN(fen)
+	return gs
+
+'''
+Run every position of PERFT_POSITIONS at each depth whose known count is at most maxNodes, printing the
+count, the time and the nodes per second. Returns (all counts correct, total nodes, total seconds).
+'''
+def runSuite(maxNodes=SUITE_MAX_NODES, bitboards=False, cache=None, out=sys.stdout):
+	passed = True
+	totalNodes = 0
+	totalTime = 0.0
+	for name, fen, counts in PERFT_POSITIONS:
+		gs = newGameState(fen, bitboards)
+		for depth, expected in enumerate(counts, 1):
+			if expected > maxNodes and depth > 1:
+				break
+			start = time.perf_counter()
+			nodes = perft(gs, depth, cache)
+			elapsed = time.perf_counter() - start
+			totalNodes += nodes
+			totalTime += elapsed
+			ok = nodes == expected
+			passed = passed and ok
+			print("%-36s depth %d %10d %s %8.3fs %9d nps" % (name, depth, nodes, "ok" if ok else "FAILED, expected %d" % expected,
+																	 elapsed, nodes / elapsed if elapsed > 0 else 0), file=out)
+	print("%s: %d nodes in %.2fs, %d nps" % ("passed" if passed else "FAILED", totalNodes, totalTime,
+											 totalNodes / totalTime if totalTime > 0 else 0), file=out)
+	return passed, totalNodes, totalTime
+
+def main(args=None):
+	parser = argparse.ArgumentParser(description="Count and time the leaves of the move generation tree.")
+	parser.add_argument("--fen", help="position to count, 'startpos' for the initial position. Without it the standard suite is run")
+	parser.add_argument("--depth", type=int, default=4, help="depth for --fen (default 4)")
+	parser.add_argument("--divide", action="store_true", help="print the count under every root move")
+	parser.add_argument("--max-nodes", type=int, default=SUITE_MAX_NODES, help="largest count the suite runs (default %d)" % SUITE_MAX_NODES)
+	parser.add_argument("--bitboards", action="store_true", help="use the bitboard move generator")
+	parser.add_argument("--hash", type=int, default=0, metavar="MB", help="size of the perft cache, 0 for none (default)")
+	args = parser.parse_args(args)
+	cache = PerftCache(args.hash) if args.hash > 0 else None
+
+	if args.fen is None:
+		passed = runSuite(args.max_nodes, args.bitboards, cache)[0]
+		return 0 if passed else 1
+
+	gs = newGameState(STARTPOS if args.fen == "startpos" else args.fen, args.bitboards)
+	start = time.perf_counter()
+	if args.divide:
+		results = divide(gs, args.depth, cache)
+		for move, nodes in results:
+			print("%s: %d" % (move, nodes))
+		nodes = sum(nodes for move, nodes in results)
+	else:
+		nodes = perft(gs, args.depth, cache)
+	elapsed = time.perf_counter() - start
+	print("nodes %d time %.3fs nps %d" % (nodes, elapsed, nodes / elapsed if elapsed > 0 else 0))
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -1,4 +1,13 @@
+import atexit
+import multiprocessing
+import pickle
 import random
+import time
+from multiprocessing import shared_memory
+import OpeningBook
+import Tablebase
+import Telemetry
+from ChessEngine import PIECES, CAPTURE_MASK, PROMOTION_FLAG, Move
 
 pieceScore = {"K": 0,
 			  "Q": 15, 
@@ -78,9 +87,249 @@ piecePositionScores = {"N":KnightScore,
 					   "K":kingScores,
 					   "R":rookScores}
 
+'''
+pieceScore and piecePositionScores folded into one list per piece, indexed by row*8 + col and signed so
+that black pieces count negative. Values are in tenths of a pawn (the position scores are worth .1 each),
+which keeps the running score GameState maintains in makeMove/undoMove an exact integer.
+The outer list is indexed by the piece numbers of ChessEngine.PIECES, the empty square scores 0.
+'''
+def buildPieceSquareScores():
+	table = [[0]*64]
+	for color, piece in PIECES[1:]:
+		sign = 1 if color == 'w' else -1
+		positionScores = piecePositionScores[color + piece] if piece == 'p' else piecePositionScores[piece]
+		table.append([sign*(10*pieceScore[piece] + positionScores[sq // 8][sq % 8]) for sq in range(64)])
+	return table
+
+pieceSquareScores = buildPieceSquareScores()
+
 CHECKMATE = 1000
 STALEMATE = 0
-DEPTH = 3
+TABLEBASE_WIN = CHECKMATE // 2 #score of a tablebase win, less a point per ply to the mate
+CHECK_INCREMENTAL_SCORE = False #debugging aid, compare every incremental score against a full board scan
+DEPTH = 3 #default search depth when findBestMove is given no budget
+MAX_DEPTH = 64 #deepest iteration tried when searching on a time or node budget
+MAX_QUIESCENCE_PLY = 16 #captures searched past the horizon before the position is just scored
+#a mate found by the search scores CHECKMATE less the plies from the root to it, so scores from MATE_BOUND up are mates
+MATE_BOUND = CHECKMATE - MAX_DEPTH - MAX_QUIESCENCE_PLY
+KNOWN_WIN = TABLEBASE_WIN - Tablebase.MAX_PLIES #scores from here up are mates or tablebase wins, see scoreToTable
+DELTA_MARGIN = 2 #a capture is skipped if even winning the piece plus this much can't raise alpha
+BUDGET_CHECK_INTERVAL = 1024 #nodes searched between two looks at the clock
+HASH_SIZE_MB = 16 #upper bound on the memory used by the transposition table
+SEARCH_WORKERS = 1 #processes findBestMove searches with, more than 1 runs the parallel search, see setSearchWorkers
+NULL_WINDOW = 0.01 #width of the scout windows of the principal variation search, less than the 0.1 scores move by
+ASPIRATION_DEPTH = 3 #first iteration searched with a window around the score of the one before
+ASPIRATION_WINDOW = 0.5 #half width of that window, doubled every time the score falls outside
+NULL_MOVE_PRUNING = True #try passing first, a position still good enough after that is cut off
+NULL_MOVE_MIN_DEPTH = 2 #shallowest depth a null move is tried at
+NULL_MOVE_REDUCTION = 2 #plies less than a real move the null move is searched to
+LATE_MOVE_REDUCTIONS = True #search the quiet moves that come late in the move order a ply less
+LMR_MIN_DEPTH = 3 #shallowest depth moves are reduced at
+LMR_FULL_MOVES = 3 #moves searched to the full depth before the reductions start
+LMR_REDUCTION = 1
+
+#transposition table bound types
+EXACT = 0
+LOWERBOUND = 1 #score failed high, the real score is at least this
+UPPERBOUND = 2 #score failed low, the real score is at most this
+
+
+'''
+Fixed size hash table of searched positions, indexed by the low bits of the zobrist key.
+Each slot holds the key, the score and a packed word with depth, bound type, age and best move.
+A slot is replaced when it is empty, holds the same position, was written by an older search
+or was searched to a smaller depth than the new entry.
+The table lives in one flat buffer, which may be a multiprocessing.shared_memory block so that the
+processes of a parallel search share it. Slots are written without locks, so the key is stored xored
+with the score and data words and an entry half overwritten by another process just fails to match.
+'''
+class TranspositionTable():
+	ENTRY_SIZE = 24 #bytes per slot: 8 for the key, 8 for the score, 8 for the packed data
+
+	def __init__(self, sizeMB=HASH_SIZE_MB, buffer=None):
+		entries = self.entryCount(sizeMB)
+		self.mask = entries - 1
+		if buffer is None:
+			buffer = bytearray(entries * self.ENTRY_SIZE)
+		self.buffer = memoryview(buffer)[:entries * self.ENTRY_SIZE]
+		size = entries * 8
+		self.keys = self.buffer[:size].cast('Q')
+		self.scores = self.buffer[size:2*size].cast('d')
+		self.scoreBits = self.buffer[size:2*size].cast('Q') #the scores as ints, for the key check
+		self.data = self.buffer[2*size:].cast('Q')
+		self.age = 0
+
+	@classmethod
+	def entryCount(cls, sizeMB):
+		return 1 << (max(1, sizeMB*1024*1024 // cls.ENTRY_SIZE).bit_length() - 1) #round down to a power of 2
+
+	'''
+	Let go of the buffer, needed before a shared memory block can be closed
+	'''
+	def release(self):
+		for view in (self.keys, self.scores, self.scoreBits, self.data, self.buffer):
+			view.release()
+
+	'''
+	Called at the start of every search, entries from earlier searches become the first to be replaced
+	'''
+	def newSearch(self):
+		self.age = (self.age + 1) & 0xFF
+
+	def clear(self):
+		self.buffer[:] = bytes(len(self.buffer))
+		self.age = 0
+
+	'''
+	Returns (depth, bound, score, bestMove) for the position, or None if it is not stored. The move is a packed code.
+	'''
+	def probe(self, key):
+		i = key & self.mask
+		data = self.data[i]
+		if data == 0 or self.keys[i] ^ data ^ self.scoreBits[i] != key:
+			return None
+		return (data & 0xFF) - 1, (data >> 8) & 0x3, self.scores[i], data >> 18
+
+	def store(self, key, depth, bound, score, bestMove):
+		i = key & self.mask
+		old = self.data[i]
+		if old != 0 and self.keys[i] ^ old ^ self.scoreBits[i] != key and ((old >> 10) & 0xFF) == self.age and (old & 0xFF) - 1 > depth:
+			return #keep the deeper entry from this search
+		#depth is stored off by one so that a used slot never packs to 0
+		data = (depth + 1) | bound << 8 | self.age << 10 | bestMove << 18
+		self.scores[i] = score
+		self.data[i] = data
+		self.keys[i] = key ^ data ^ self.scoreBits[i]
+
+
+transpositionTable = TranspositionTable()
+
+'''
+Move ordering. Moves are sorted by these scores before the search loop, highest first:
+the hash move, then captures by MVV-LVA (most valuable victim, least valuable attacker),
+promotions, the two killer moves of the ply and finally quiet moves by their history score.
+'''
+HASH_MOVE_ORDER = 10000000
+CAPTURE_ORDER = 2000000
+PROMOTION_ORDER = 1900000
+KILLER_ORDER = 1800000 #second killer gets one less
+HISTORY_LIMIT = 1000000 #history scores are halved when one reaches this, so they stay below the killers
+orderingValue = {"K": 20, "Q": 15, "R": 7, "B": 3, "N": 3, "p": 1} #king as attacker is tried last
+#the same values and pieceScore by piece number, for reading straight out of a packed move
+pieceOrderingValue = [0] + [orderingValue[piece[1]] for piece in PIECES[1:]]
+pieceValue = [0] + [pieceScore[piece[1]] for piece in PIECES[1:]]
+
+killerMoves = [[0, 0] for ply in range(MAX_DEPTH + 1)] #quiet moves that caused a cutoff at each ply
+historyTable = [[0]*64 for piece in PIECES] #indexed by piece number and target square
+
+'''
+Sort packed moves (see ChessEngine.Move) in place, best first
+'''
+def orderMoves(moves,hashMove,ply):
+	killer1, killer2 = killerMoves[ply]
+	def moveOrder(move):
+		if move == hashMove:
+			return HASH_MOVE_ORDER
+		if move & CAPTURE_MASK:
+			return CAPTURE_ORDER + 100*pieceOrderingValue[(move >> 16) & 15] - pieceOrderingValue[(move >> 12) & 15]
+		if move & PROMOTION_FLAG:
+			return PROMOTION_ORDER
+		if move == killer1:
+			return KILLER_ORDER
+		if move == killer2:
+			return KILLER_ORDER - 1
+		return historyTable[(move >> 12) & 15][(move >> 6) & 63]
+	moves.sort(key=moveOrder, reverse=True) #stable, equal moves keep their shuffled order
+
+'''
+Staged move picker for the nodes below the root: yields the valid packed moves of the position one at a time, in the
+order orderMoves would sort them, generating them only as they are needed. First the hash move, then the captures
+and promotions by MVV-LVA, the killer moves of the ply and last the other quiet moves by history score. Most cut
+nodes are refuted by the hash move or a capture, their quiet moves are then never generated. In check all the
+evasions are generated at once. Yields nothing when there is no valid move, gs.inCheck then tells mate from stalemate.
+'''
+def pickMoves(gs,hashMove,ply):
+	if hashMove and gs.isValidMoveCode(hashMove):
+		yield hashMove
+	captures = gs.getValidCaptureCodes() #also sets gs.inCheck
+	if gs.inCheck: #every evasion was generated
+		orderMoves(captures,hashMove,ply)
+		for move in captures:
+			if move != hashMove:
+				yield move
+		return
+	generation = gs.generationState() #the quiet moves are generated with it, after the captures were searched
+	captures.sort(key=captureOrder, reverse=True)
+	for move in captures:
+		if move != hashMove:
+			yield move
+	killer1, killer2 = killerMoves[ply]
+	for killer in (killer1, killer2):
+		if killer and killer != hashMove and gs.isValidMoveCode(killer):
+			yield killer
+	quiets = gs.getValidQuietCodes(generation)
+	quiets.sort(key=historyOrder, reverse=True)
+	for move in quiets:
+		if move != hashMove and move != killer1 and move != killer2:
+			yield move
+
+def historyOrder(move):
+	return historyTable[(move >> 12) & 15][(move >> 6) & 63]
+
+'''
+Remember a quiet move that caused a beta cutoff, as a killer for this ply and in the history table
+'''
+def updateQuietCutoff(move,depth,ply):
+	killers = killerMoves[ply]
+	if killers[0] != move:
+		killers[1] = killers[0]
+		killers[0] = move
+	history = historyTable[(move >> 12) & 15]
+	square = (move >> 6) & 63
+	history[square] += depth*depth
+	if history[square] >= HISTORY_LIMIT:
+		for table in historyTable:
+			for i in range(64):
+				table[i] //= 2
+
+def clearMoveOrdering():
+	for killers in killerMoves:
+		killers[0] = killers[1] = 0
+	for table in historyTable:
+		for i in range(64):
+			table[i] = 0
+
+#search state shared by findBestMove and findMoveNegaMaxAlphaBeta
+nextMove = None
+rootDepth = DEPTH
+nodesSearched = 0
+quiescenceNodes = 0
+betaCutoffs = 0
+firstMoveCutoffs = 0 #cutoffs by the first move tried
+hashCutoffs = 0 #nodes answered by the transposition table
+tablebaseHits = 0
+researches = 0 #moves searched again with the full window after their scout failed high
+aspirationFails = 0 #root searches repeated with a wider window
+nullMoveCutoffs = 0 #nodes cut off by the null move
+lmrResearches = 0 #reduced moves searched again to the full depth after failing high
+completedDepth = 0 #depth of the last iteration the search finished
+bestScore = 0 #its score, in pawns from the point of view of the side to move
+searchStopped = False
+searchDeadline = None
+searchNodeLimit = None
+nextBudgetCheck = BUDGET_CHECK_INTERVAL
+
+#parallel search state, see parallelSearch
+openingBook = None #OpeningBook findBestMove plays from before searching, see setOpeningBook
+playedBookMove = False #whether the last move findBestMove returned came from the book
+telemetry = Telemetry.Telemetry() #stats of every search, see Telemetry.py
+tablebasePieces = 0 #positions with at most this many pieces are looked up in the tablebases, see setTablebasePath
+
+workerPool = None
+workerCount = 1
+workerMemory = None #shared memory block holding the transposition table
+workerStopFlag = None #set when the helpers have to stop searching
+helperStopFlag = None #the same flag as seen from inside a helper process
 
 def findRandomMove(validMoves):
 	return validMoves[random.randint(0,len(validMoves)-1)]
@@ -120,16 +369,297 @@ def findBestMove(gs,validMoves):
 	return bestPlayerMove
 
 '''
-Score the board based on material
+Iterative deepening driver. Searches depth 1, 2, 3... until maxDepth is reached or the time (seconds)
+or node budget runs out, and returns the best move of the last iteration that completed.
+The search itself works on packed moves, the Move objects are only used to hand the answer back.
+With more than one worker (SEARCH_WORKERS by default) the search runs in that many processes, see
+parallelSearch. With a single worker it is the plain serial search, which only depends on the state of
+random (used to shuffle the moves) and of the transposition table.
+While the position is in the opening book (see setOpeningBook) a book move is played without searching.
 '''
-#Helper method to make first recursive call
-def findBestMove(gs,validMoves):
-	global nextMove
-	nextMove = None
+def findBestMove(gs,validMoves,maxDepth=None,timeLimit=None,nodeLimit=None,workers=None):
+	global nodesSearched, completedDepth, bestScore, playedBookMove
+	if workers is None:
+		workers = SEARCH_WORKERS
+	if workers > 1 and (workerPool is None or workerCount != workers): #not on the clock of the search
+		startWorkers(workers)
+	telemetry.startSearch(workers)
+	playedBookMove = False
+	if openingBook is not None:
+		bookMove = openingBook.pickMove(gs,validMoves)
+		if bookMove is not None: #no search at all
+			nodesSearched = completedDepth = bestScore = 0
+			playedBookMove = True
+			telemetry.endSearch({}, bookMove.getChessNotation(), True)
+			return bookMove
+	if maxDepth is None:
+		maxDepth = DEPTH if timeLimit is None and nodeLimit is None else MAX_DEPTH
 	random.shuffle(validMoves)
-	findMoveNegaMaxAlphaBeta(gs,validMoves,DEPTH,-CHECKMATE, CHECKMATE, 1 if gs.whitetoMove else -1)
-	
-	return nextMove
+	rootMoves = [move.code for move in validMoves]
+	if workers > 1:
+		bestMove = parallelSearch(gs,rootMoves,maxDepth,timeLimit,nodeLimit,workers)
+	else:
+		transpositionTable.newSearch()
+		clearMoveOrdering()
+		bestMove = iterativeDeepening(gs,rootMoves,maxDepth,timeLimit,nodeLimit)[0]
+	move = None
+	for validMove in validMoves:
+		if validMove.code == bestMove:
+			move = validMove
+	telemetry.endSearch(searchCounters(), move.getChessNotation() if move is not None else None)
+	return move
+
+'''
+Search the packed root moves one iteration deeper at a time. The best move of each iteration is searched
+first in the next one. Returns (best move, depth of the last completed iteration).
+'''
+def iterativeDeepening(gs,rootMoves,maxDepth,timeLimit,nodeLimit):
+	global nextMove, rootDepth, nodesSearched, completedDepth, bestScore, searchStopped, searchDeadline, searchNodeLimit, nextBudgetCheck
+	global quiescenceNodes, betaCutoffs, firstMoveCutoffs, hashCutoffs, tablebaseHits, researches, aspirationFails, nullMoveCutoffs, lmrResearches
+	startTime = time.perf_counter()
+	searchDeadline = startTime + timeLimit if timeLimit is not None else None
+	searchNodeLimit = nodeLimit
+	searchStopped = False
+	nodesSearched = quiescenceNodes = betaCutoffs = firstMoveCutoffs = hashCutoffs = tablebaseHits = researches = aspirationFails = 0
+	nullMoveCutoffs = lmrResearches = 0
+	recording = telemetry.current is not None #not in the helpers of a parallel search
+	if recording and telemetry.timeCalls:
+		timeSearchCalls(gs)
+	nextBudgetCheck = BUDGET_CHECK_INTERVAL if nodeLimit is None else min(BUDGET_CHECK_INTERVAL, nodeLimit)
+
+	bestMove = None
+	completedDepth = 0
+	bestScore = 0
+	for depth in range(1, maxDepth+1):
+		rootDepth = depth
+		#aspiration window: the score rarely moves far from one iteration to the next, a narrow window cuts more
+		window = ASPIRATION_WINDOW
+		if depth >= ASPIRATION_DEPTH and abs(bestScore) < KNOWN_WIN:
+			alpha, beta = max(bestScore - window, -CHECKMATE), min(bestScore + window, CHECKMATE)
+		else:
+			alpha, beta = -CHECKMATE, CHECKMATE
+		while True:
+			nextMove = None
+			score = findMoveNegaMaxAlphaBeta(gs,rootMoves,depth,alpha,beta,1 if gs.whitetoMove else -1)
+			if searchStopped:
+				break
+			#outside the window the score is only a bound, search again with the window widened on that side
+			if score <= alpha and alpha > -CHECKMATE:
+				window *= 2
+				alpha = max(bestScore - window, -CHECKMATE)
+			elif score >= beta and beta < CHECKMATE:
+				window *= 2
+				beta = min(bestScore + window, CHECKMATE)
+			else:
+				break
+			aspirationFails += 1
+		if searchStopped: #unfinished iteration, its result can't be trusted
+			break
+		completedDepth = depth
+		bestScore = score
+		if nextMove is not None:
+			bestMove = nextMove
+			#principal variation move first in the next iteration, ordering keeps it there as the hash move
+			rootMoves.insert(0, rootMoves.pop(rootMoves.index(bestMove)))
+		if recording:
+			telemetry.iteration(depth, score, Move.fromCode(bestMove).getChessNotation() if bestMove is not None else None, searchCounters())
+		if abs(score) >= MATE_BOUND: #a forced mate, the shortest one is found first
+			break
+		if abs(score) >= KNOWN_WIN: #the result is known from the tablebases
+			break
+		#the next iteration takes several times longer than this one, don't start what can't finish
+		if searchDeadline is not None and time.perf_counter() - startTime > timeLimit / 2:
+			break
+
+	if bestMove is None and len(rootMoves) > 0: #ran out of budget in the very first iteration
+		bestMove = rootMoves[0]
+	if recording and telemetry.timeCalls:
+		untimeSearchCalls(gs)
+	return bestMove, completedDepth
+
+'''
+Counters of the search running or last run, for the telemetry
+'''
+def searchCounters():
+	return {"nodes": nodesSearched, "quiescenceNodes": quiescenceNodes, "betaCutoffs": betaCutoffs, "firstMoveCutoffs": firstMoveCutoffs,
+			"hashCutoffs": hashCutoffs, "tablebaseHits": tablebaseHits, "researches": researches, "aspirationFails": aspirationFails,
+			"nullMoveCutoffs": nullMoveCutoffs, "lmrResearches": lmrResearches,
+			"depth": completedDepth, "score": bestScore}
+
+'''
+Time the move generation and evaluation calls of a search, by wrapping them until untimeSearchCalls.
+Nothing is wrapped when the telemetry doesn't time calls, the search then pays nothing for it.
+'''
+def timeSearchCalls(gs):
+	global scoreBoard
+	scoreBoard = telemetry.timed(scoreBoard, "scoreBoard")
+	gs.getValidMoveCodes = telemetry.timed(gs.getValidMoveCodes, "getValidMoves")
+	gs.getValidCaptureCodes = telemetry.timed(gs.getValidCaptureCodes, "getValidCaptures")
+	gs.getValidQuietCodes = telemetry.timed(gs.getValidQuietCodes, "getValidQuiets")
+
+def untimeSearchCalls(gs):
+	global scoreBoard
+	scoreBoard = scoreBoard.__wrapped__
+	del gs.getValidMoveCodes #back to the methods of the class
+	del gs.getValidCaptureCodes
+	del gs.getValidQuietCodes
+
+'''
+Lazy SMP: the calling process and workers-1 helper processes all run the iterative deepening on the same
+root, each with its own root move order, sharing the transposition table through shared memory. The
+helpers fill the table with positions the main search then finds already searched, so together they get
+to a given depth sooner. When the main search finishes the helpers are stopped and the move of the
+deepest completed iteration is returned, the main search's on a tie. The node limit is the main search's,
+nodesSearched is afterwards the total of all processes.
+'''
+def parallelSearch(gs,rootMoves,maxDepth,timeLimit,nodeLimit,workers):
+	global nodesSearched, completedDepth, bestScore
+	transpositionTable.newSearch()
+	clearMoveOrdering()
+	workerStopFlag.value = 0
+	state = pickle.dumps(gs) #taken now, the main search changes gs while the tasks are being sent
+	helpers = [workerPool.apply_async(helperSearch, (state, list(rootMoves), maxDepth, timeLimit, transpositionTable.age, seed))
+			   for seed in range(1, workers)]
+	bestMove, bestDepth = iterativeDeepening(gs,rootMoves,maxDepth,timeLimit,nodeLimit)
+	workerStopFlag.value = 1
+	totalNodes = nodesSearched
+	for helper in helpers:
+		move, depth, score, nodes = helper.get()
+		totalNodes += nodes
+		if depth > bestDepth:
+			bestMove, bestDepth = move, depth
+			completedDepth, bestScore = depth, score
+	nodesSearched = totalNodes
+	return bestMove
+
+'''
+Runs in a helper process. The seed gives every helper a different, but repeatable, root move order.
+'''
+def helperSearch(state, rootMoves, maxDepth, timeLimit, age, seed):
+	gs = pickle.loads(state)
+	transpositionTable.age = age
+	clearMoveOrdering()
+	random.Random(seed).shuffle(rootMoves)
+	bestMove, depth = iterativeDeepening(gs,rootMoves,maxDepth,timeLimit,None)
+	return bestMove, depth, bestScore, nodesSearched
+
+'''
+Start the helper processes for a search with the given number of workers and move the transposition table
+into shared memory. Returns once every helper has started and attached to the table, so that none of it is
+done on the time of a search. setSearchWorkers calls it, findBestMove does when it is given another count.
+'''
+def startWorkers(workers):
+	global workerPool, workerCount, workerMemory, workerStopFlag, transpositionTable
+	stopWorkers()
+	#spawn, not fork: the search usually runs on a thread and forking then can copy locks held by the others
+	context = multiprocessing.get_context("spawn")
+	workerMemory = shared_memory.SharedMemory(create=True, size=TranspositionTable.entryCount(HASH_SIZE_MB) * TranspositionTable.ENTRY_SIZE)
+	transpositionTable = TranspositionTable(HASH_SIZE_MB, workerMemory.buf)
+	workerStopFlag = context.Value('b', 0, lock=False)
+	ready = context.Semaphore(0)
+	workerPool = context.Pool(workers - 1, initializer=initWorker, initargs=(workerMemory.name, HASH_SIZE_MB, workerStopFlag, Tablebase.tablebaseDirectory, ready))
+	workerCount = workers
+	for helper in range(workers - 1):
+		ready.acquire()
+
+'''
+Shut the helper processes down and give the transposition table its own memory again
+'''
+def stopWorkers():
+	global workerPool, workerCount, workerMemory, workerStopFlag, transpositionTable
+	if workerPool is None:
+		return
+	workerPool.terminate()
+	workerPool.join()
+	transpositionTable.release()
+	transpositionTable = TranspositionTable(HASH_SIZE_MB)
+	workerMemory.close()
+	workerMemory.unlink()
+	workerPool = workerMemory = workerStopFlag = None
+	workerCount = 1
+
+atexit.register(stopWorkers)
+
+'''
+Search with this many processes from now on, starting or stopping the helpers right away
+'''
+def setSearchWorkers(workers):
+	global SEARCH_WORKERS
+	SEARCH_WORKERS = workers
+	if workers > 1:
+		startWorkers(workers)
+	else:
+		stopWorkers()
+
+'''
+Play from the Polyglot book at path from now on, or stop using a book if path is None or empty
+'''
+def setOpeningBook(path):
+	global openingBook
+	if openingBook is not None:
+		openingBook.close()
+		openingBook = None
+	openingBook = OpeningBook.OpeningBook(path) if path else None
+
+'''
+Look positions with few pieces up in the tablebases of the directory at path from now on, None for no tablebases
+'''
+def setTablebasePath(path):
+	global tablebasePieces
+	workers = workerCount
+	stopWorkers() #the helpers have to open the new tables, they are started again if they were running
+	tablebasePieces = Tablebase.setDirectory(path)
+	if workers > 1:
+		startWorkers(workers)
+
+'''
+Resize the transposition table, what it held is lost
+'''
+def setHashSize(sizeMB):
+	global HASH_SIZE_MB, transpositionTable
+	workers = workerCount
+	stopWorkers() #the helpers map the old table, they are started again if they were running
+	HASH_SIZE_MB = sizeMB
+	transpositionTable = TranspositionTable(sizeMB)
+	if workers > 1:
+		startWorkers(workers)
+
+'''
+Pool initializer of the helper processes, attaches to the shared transposition table and maps the tablebases,
+then tells startWorkers it is ready
+'''
+def initWorker(memoryName, sizeMB, stopFlag, tablebaseDirectory, ready):
+	global workerMemory, helperStopFlag, transpositionTable, tablebasePieces
+	memory = shared_memory.SharedMemory(name=memoryName)
+	transpositionTable = TranspositionTable(sizeMB, memory.buf)
+	workerMemory = memory
+	helperStopFlag = stopFlag
+	tablebasePieces = Tablebase.setDirectory(tablebaseDirectory)
+	ready.release()
+
+'''
+Ask a running search to stop, findBestMove then returns the move of the last completed iteration
+'''
+def stopSearch():
+	global searchStopped
+	searchStopped = True
+	if workerStopFlag is not None:
+		workerStopFlag.value = 1
+
+'''
+Called every BUDGET_CHECK_INTERVAL nodes (and when the node limit is reached) to see if the budget ran out
+'''
+def checkBudget():
+	global searchStopped, nextBudgetCheck
+	if searchNodeLimit is not None and nodesSearched >= searchNodeLimit:
+		searchStopped = True
+	elif searchDeadline is not None and time.perf_counter() >= searchDeadline:
+		searchStopped = True
+	elif helperStopFlag is not None and helperStopFlag.value:
+		searchStopped = True
+	nextBudgetCheck = nodesSearched + BUDGET_CHECK_INTERVAL
+	if searchNodeLimit is not None:
+		nextBudgetCheck = min(nextBudgetCheck, searchNodeLimit)
 
 
 def findMoveMinMax(gs,validMoves,depth,whitetoMove):
@@ -186,31 +716,190 @@ def findMoveNegaMax(gs,validMoves,depth,turnMultiplier):
 	
 	return maxScore
 
-def findMoveNegaMaxAlphaBeta(gs,validMoves,depth,alpha,beta,turnMultiplier):
-	global nextMove
+def findMoveNegaMaxAlphaBeta(gs,validMoves,depth,alpha,beta,turnMultiplier,ply=0,allowNullMove=True):
+	global nextMove, nodesSearched, betaCutoffs, firstMoveCutoffs, hashCutoffs, tablebaseHits, researches, nullMoveCutoffs, lmrResearches
+	if ply != 0 and gs.pieceCount <= tablebasePieces: #exact score, no need to search
+		result = Tablebase.probe(gs)
+		if result is not None:
+			nodesSearched += 1
+			tablebaseHits += 1
+			return result[0] * (TABLEBASE_WIN - min(ply + result[1], Tablebase.MAX_PLIES)) #plies counted from the root
 	if depth == 0:
-		return turnMultiplier * scoreBoard(gs)
+		return quiescenceSearch(gs,alpha,beta,turnMultiplier,0,ply)
+	nodesSearched += 1
+	if nodesSearched >= nextBudgetCheck:
+		checkBudget()
+	if searchStopped:
+		return 0
+
+	#look the position up in the transposition table
+	alphaOriginal = alpha
+	hashMove = 0
+	entry = transpositionTable.probe(gs.zobristKey)
+	if entry is not None:
+		entryDepth, bound, entryScore, hashMove = entry
+		entryScore = scoreFromTable(entryScore, ply)
+		if entryDepth >= depth and ply != 0: #the root always searches, it has to set nextMove
+			if bound == EXACT:
+				hashCutoffs += 1
+				return entryScore
+			elif bound == LOWERBOUND:
+				alpha = max(alpha, entryScore)
+			else:
+				beta = min(beta, entryScore)
+			if alpha >= beta:
+				hashCutoffs += 1
+				return entryScore
+
+	#only the pruning below needs to know about check before the moves are generated
+	inCheck = depth >= 2 and (NULL_MOVE_PRUNING or LATE_MOVE_REDUCTIONS) and gs.kingInCheck()
+	#null-move pruning: if the side to move can pass and still score at least beta, one of its moves will too.
+	#Not when in check, after another null move or with only pawns left, where zugzwang makes passing the best move.
+	if NULL_MOVE_PRUNING and allowNullMove and ply != 0 and depth >= NULL_MOVE_MIN_DEPTH and not inCheck and \
+			turnMultiplier * scoreBoard(gs) >= beta and gs.hasNonPawnMaterial():
+		gs.makeNullMove()
+		score = -findMoveNegaMaxAlphaBeta(gs,None,max(depth-1-NULL_MOVE_REDUCTION, 0),-beta,-beta+NULL_WINDOW,-turnMultiplier,ply+1,False)
+		gs.undoNullMove()
+		if searchStopped:
+			return 0
+		if score >= beta:
+			nullMoveCutoffs += 1
+			return beta #not the score, a mate found after passing doesn't prove anything
 
 	#move ordering - Evaluate best moves first, then the worst branches
-	#Could Evaluate check and captures first
+	if ply == 0:
+		if rootDepth > 1:
+			hashMove = validMoves[0] #best move of the previous iteration
+		orderMoves(validMoves,hashMove,ply)
+		moves = validMoves
+	else: #below the root the moves are generated as they are searched
+		moves = pickMoves(gs,hashMove,ply)
 
 	maxScore = -CHECKMATE
-	
-	for move in validMoves:
-		gs.makeMove(move)
-		nextMoves = gs.getValidMoves()
-		score = -findMoveNegaMaxAlphaBeta(gs,nextMoves,depth-1,-beta,-alpha,-turnMultiplier)
+	bestMove = 0
+	movesSearched = 0
+	for move in moves:
+		movesSearched += 1
+		gs.makeMoveCode(move)
+		if movesSearched == 1:
+			score = -findMoveNegaMaxAlphaBeta(gs,None,depth-1,-beta,-alpha,-turnMultiplier,ply+1)
+		else: #principal variation search: a null window only proves the move is no better than the best so far
+			#late move reductions: a quiet move this far down the order rarely is, it is searched a ply less,
+			#unless it gives check (the king of the side now to move is attacked)
+			reduction = 0
+			if LATE_MOVE_REDUCTIONS and depth >= LMR_MIN_DEPTH and movesSearched > LMR_FULL_MOVES and not inCheck and \
+					not move & (CAPTURE_MASK | PROMOTION_FLAG) and move != killerMoves[ply][0] and move != killerMoves[ply][1] and \
+					not gs.kingInCheck():
+				reduction = LMR_REDUCTION
+			score = -findMoveNegaMaxAlphaBeta(gs,None,depth-1-reduction,-alpha-NULL_WINDOW,-alpha,-turnMultiplier,ply+1)
+			if reduction and score > alpha and not searchStopped: #it may be better after all, scout it to the full depth
+				lmrResearches += 1
+				score = -findMoveNegaMaxAlphaBeta(gs,None,depth-1,-alpha-NULL_WINDOW,-alpha,-turnMultiplier,ply+1)
+			if alpha < score < beta and not searchStopped: #it is better, search it again for its score
+				researches += 1
+				score = -findMoveNegaMaxAlphaBeta(gs,None,depth-1,-beta,-alpha,-turnMultiplier,ply+1)
 		if score > maxScore:
 			maxScore = score
-			if depth == DEPTH:
+			bestMove = move
+			if ply == 0:
 				nextMove = move
 		gs.undoMove()
+		if searchStopped:
+			return maxScore
 		if maxScore > alpha: #pruning
 			alpha = maxScore
 		if alpha >= beta:
+			betaCutoffs += 1
+			if movesSearched == 1:
+				firstMoveCutoffs += 1
+			if not move & (CAPTURE_MASK | PROMOTION_FLAG):
+				updateQuietCutoff(move,depth,ply)
 			break
+	if movesSearched == 0: #no valid move
+		return -(CHECKMATE - ply) if gs.inCheck else STALEMATE
+
+	if maxScore <= alphaOriginal:
+		bound = UPPERBOUND
+	elif maxScore >= beta:
+		bound = LOWERBOUND
+	else:
+		bound = EXACT
+	transpositionTable.store(gs.zobristKey, depth, bound, scoreToTable(maxScore, ply), bestMove)
 	return maxScore
 
+'''
+Mate and tablebase scores count the plies from the root to the mate. The transposition table holds them counted
+from the position stored instead, so that they are still right when it is reached again at another ply.
+'''
+def scoreToTable(score, ply):
+	if score >= KNOWN_WIN:
+		return score + ply
+	if score <= -KNOWN_WIN:
+		return score - ply
+	return score
+
+def scoreFromTable(score, ply):
+	if score >= KNOWN_WIN:
+		return score - ply
+	if score <= -KNOWN_WIN:
+		return score + ply
+	return score
+
+'''
+Search captures and promotions past the horizon until the position is quiet, so that a leaf is never
+scored in the middle of an exchange. The side to move may stand pat on the static score instead of
+capturing, except when in check, where every evasion is searched.
+'''
+def quiescenceSearch(gs,alpha,beta,turnMultiplier,qply,ply):
+	global nodesSearched, quiescenceNodes
+	nodesSearched += 1
+	quiescenceNodes += 1
+	if nodesSearched >= nextBudgetCheck:
+		checkBudget()
+	if searchStopped:
+		return 0
+	if qply >= MAX_QUIESCENCE_PLY:
+		return turnMultiplier * scoreBoard(gs)
+
+	captures = gs.getValidCaptureCodes()
+	inCheck = gs.inCheck
+	if inCheck:
+		if len(captures) == 0: #checkmate
+			return -(CHECKMATE - ply)
+		standPat = bestScore = -CHECKMATE
+	else:
+		#a stalemate at the horizon, the quiet moves are only generated when there is no capture to make
+		if qply == 0 and len(captures) == 0 and len(gs.getValidQuietCodes()) == 0:
+			return STALEMATE
+		standPat = bestScore = turnMultiplier * scoreBoard(gs)
+		if standPat >= beta:
+			return standPat
+		if standPat > alpha:
+			alpha = standPat
+
+	captures.sort(key=captureOrder, reverse=True)
+	for move in captures:
+		#delta pruning
+		if not inCheck and not move & PROMOTION_FLAG and standPat + pieceValue[(move >> 16) & 15] + DELTA_MARGIN <= alpha:
+			continue
+		gs.makeMoveCode(move)
+		score = -quiescenceSearch(gs,-beta,-alpha,-turnMultiplier,qply+1,ply+1)
+		gs.undoMove()
+		if searchStopped:
+			return bestScore
+		if score > bestScore:
+			bestScore = score
+			if score > alpha:
+				alpha = score
+				if alpha >= beta:
+					break
+	return bestScore
+
+def captureOrder(move):
+	if move & CAPTURE_MASK:
+		return 100*pieceOrderingValue[(move >> 16) & 15] - pieceOrderingValue[(move >> 12) & 15]
+	return 0 #quiet promotion or check evasion
+
 '''
 Positive score is good for white, a negative score is good for black
 '''
@@ -222,7 +911,16 @@ def scoreBoard(gs):
 			return CHECKMATE #White wins
 	elif gs.staleMate:
 		return STALEMATE
-	
+
+	if CHECK_INCREMENTAL_SCORE:
+		assert abs(gs.boardScore/10 - scoreBoardFullScan(gs)) < 1e-9, "incremental score out of sync"
+	return gs.boardScore / 10
+
+'''
+Scores the board by scanning every square. scoreBoard uses the score GameState keeps up to date instead,
+this version is kept to cross-check it.
+'''
+def scoreBoardFullScan(gs):
 	score = 0 
 	for row in range(len(gs.board)):
 		for col in range(len(gs.board[row])):
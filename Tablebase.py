@@ -0,0 +1,593 @@
+"""
+Endgame tablebases for the endings with 3 and 4 pieces (kings included), made by retrograde analysis.
+A table holds the distance to mate of every position of one material signature, e.g. KQvK or KRvKP: one byte
+per position in a file addressed by the position index, so a probe is a single read. The files are opened
+with mmap, processes probing the same table share its pages.
+python Tablebase.py generate KQvK KRvK --dir tablebases makes tables (all of those with 3 pieces by default),
+python Tablebase.py probe --fen "<fen>" --dir tablebases looks a position up.
+Like the rest of the engine the tables only know promotions to a queen. En-passant captures aren't part of
+them either, positions where one is possible are not probed.
+"""
+import argparse
+import itertools
+import mmap
+import os
+import re
+import sys
+import time
+from array import array
+import ChessEngine
+
+MAX_PIECES = 4
+TABLEBASE_DIR = "tablebases"
+FILE_EXTENSION = ".tb"
+ILLEGAL = 255 #byte of an index that isn't a legal position
+MAX_PLIES = 253 #longest distance to mate a byte can hold, values are plies + 1 and 0 is a draw
+WIN = 1
+DRAW = 0
+LOSS = -1
+
+SIGNATURE_ORDER = "KQRBNP" #order of the pieces of a side in a signature
+signatureValue = {"K": 0, "Q": 9, "R": 5, "B": 3, "N": 3, "P": 1}
+signaturePattern = re.compile(r"^K[QRBNP]*vK[QRBNP]*$")
+
+'''
+Attack tables over squares numbered like the move codes, row*8 + col with row 0 the 8th rank.
+attackMasks[piece type][sq] is the bitmask of the squares the piece attacks from sq on an empty board,
+betweenMasks[from*64 + to] the squares strictly between two squares on a line (0 if they aren't on one).
+'''
+def buildAttackTables():
+	steps = {"K": [(-1,-1),(-1,0),(-1,1),(0,-1),(0,1),(1,-1),(1,0),(1,1)],
+			 "N": [(-2,-1),(-2,1),(-1,-2),(-1,2),(1,-2),(1,2),(2,-1),(2,1)]}
+	directions = {"R": [(-1,0),(0,-1),(1,0),(0,1)], "B": [(-1,-1),(-1,1),(1,-1),(1,1)]}
+	directions["Q"] = directions["R"] + directions["B"]
+	attackMasks = {piece: [0]*64 for piece in "KNRBQ"}
+	targets = {piece: [[] for sq in range(64)] for piece in "KN"}
+	rays = {piece: [[] for sq in range(64)] for piece in "RBQ"} #squares along each direction, nearest first
+	betweenMasks = [0]*(64*64)
+	for sq in range(64):
+		r, c = divmod(sq, 8)
+		for piece, pieceSteps in steps.items():
+			for dr, dc in pieceSteps:
+				if 0 <= r+dr < 8 and 0 <= c+dc < 8:
+					attackMasks[piece][sq] |= 1 << ((r+dr)*8 + c+dc)
+					targets[piece][sq].append((r+dr)*8 + c+dc)
+		for piece, pieceDirections in directions.items():
+			for dr, dc in pieceDirections:
+				ray = []
+				between = 0
+				row, col = r+dr, c+dc
+				while 0 <= row < 8 and 0 <= col < 8:
+					ray.append(row*8 + col)
+					attackMasks[piece][sq] |= 1 << (row*8 + col)
+					betweenMasks[sq*64 + row*8 + col] = between
+					between |= 1 << (row*8 + col)
+					row += dr
+					col += dc
+				rays[piece][sq].append(ray)
+	#pawns attack diagonally forward, white pawns go up the board (to lower rows)
+	attackMasks["wp"] = [sum(1 << ((sq//8 - 1)*8 + sq%8 + dc) for dc in (-1, 1) if 0 < sq//8 and 0 <= sq%8 + dc < 8) for sq in range(64)]
+	attackMasks["bp"] = [sum(1 << ((sq//8 + 1)*8 + sq%8 + dc) for dc in (-1, 1) if sq//8 < 7 and 0 <= sq%8 + dc < 8) for sq in range(64)]
+	return attackMasks, targets, rays, betweenMasks
+
+attackMasks, stepTargets, slidingRays, betweenMasks = buildAttackTables()
+
+'''
+Squares of the board seen through a symmetry: mirrored left to right (files), top to bottom (ranks) or both
+'''
+def mirrorFiles(sq):
+	return sq ^ 7
+
+def mirrorRanks(sq):
+	return sq ^ 56
+
+
+'''
+Canonical form of a material signature: the pieces of each side in SIGNATURE_ORDER, the stronger side
+(more material, then the better pieces) first as white. Returns (signature, whether the colours were swapped).
+'''
+def canonicalSignature(whitePieces, blackPieces):
+	white = "".join(sorted(whitePieces, key=SIGNATURE_ORDER.index))
+	black = "".join(sorted(blackPieces, key=SIGNATURE_ORDER.index))
+	if sideStrength(black) > sideStrength(white):
+		return black + "v" + white, True
+	return white + "v" + black, False
+
+def sideStrength(pieces):
+	return (sum(signatureValue[piece] for piece in pieces), [-SIGNATURE_ORDER.index(piece) for piece in pieces])
+
+'''
+Every canonical signature with the given number of pieces
+'''
+def allSignatures(pieceCount):
+	signatures = set()
+	for blackCount in range(pieceCount - 1):
+		for white in itertools.combinations_with_replacement(SIGNATURE_ORDER[1:], pieceCount - 2 - blackCount):
+			for black in itertools.combinations_with_replacement(SIGNATURE_ORDER[1:], blackCount):
+				signatures.add(canonicalSignature("K" + "".join(white), "K" + "".join(black))[0])
+	return sorted(signatures, key=lambda signature: (len(signature), [SIGNATURE_ORDER.index(piece) for piece in signature if piece != "v"]))
+
+
+'''
+Table of one material signature. The pieces are numbered white king, the other white pieces, black king, the
+other black pieces. The index of a position is the side to move, then the square of each piece in that order,
+the white king first. Symmetry keeps the white king on a quarter of the board (a half with pawns, which can't
+be mirrored top to bottom), positions with it elsewhere are mirrored before being looked up.
+'''
+class Tablebase():
+	def __init__(self, signature, data=None):
+		white, black = signature.split("v")
+		self.signature = signature
+		self.pieces = ["w" + ("p" if piece == "P" else piece) for piece in white] + ["b" + ("p" if piece == "P" else piece) for piece in black]
+		self.hasPawns = "P" in signature
+		if self.hasPawns:
+			self.kingSquares = [sq for sq in range(64) if sq % 8 < 4]
+		else:
+			self.kingSquares = [sq for sq in range(64) if sq % 8 < 4 and sq // 8 >= 4]
+		self.kingIndex = [-1]*64
+		for i, sq in enumerate(self.kingSquares):
+			self.kingIndex[sq] = i
+		#symmetry applied to every piece, chosen by the square of the white king
+		self.symmetries = []
+		for sq in range(64):
+			if sq % 8 >= 4:
+				sq = mirrorFiles(sq)
+				flipFiles = 7
+			else:
+				flipFiles = 0
+			flipRanks = 56 if not self.hasPawns and sq // 8 < 4 else 0
+			self.symmetries.append(flipFiles | flipRanks) #xor on the square
+		self.sideSize = len(self.kingSquares) * 64**(len(self.pieces) - 1)
+		self.size = 2 * self.sideSize
+		self.file = None
+		self.data = data
+
+	'''
+	Map the table file at path, read only
+	'''
+	def open(self, path):
+		self.file = open(path, "rb")
+		if os.fstat(self.file.fileno()).st_size != self.size:
+			self.file.close()
+			raise ValueError(path + " isn't a " + self.signature + " table, it has the wrong size")
+		self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+	def close(self):
+		if self.file is not None:
+			self.data.close()
+			self.file.close()
+			self.file = self.data = None
+
+	'''
+	Index of the position with the pieces on squares (in the order of self.pieces), mirrored if need be
+	'''
+	def index(self, squares, blackToMove):
+		flip = self.symmetries[squares[0]]
+		index = self.kingIndex[squares[0] ^ flip]
+		for sq in squares[1:]:
+			index = index*64 + (sq ^ flip)
+		return index + self.sideSize if blackToMove else index
+
+	'''
+	Distance to mate of a position as (WIN, DRAW or LOSS for the side to move, plies to the mate)
+	'''
+	def probe(self, squares, blackToMove):
+		value = self.data[self.index(squares, blackToMove)]
+		if value == DRAW or value == ILLEGAL:
+			return DRAW, 0
+		plies = value - 1
+		return (WIN if plies % 2 == 1 else LOSS), plies
+
+
+tablebaseDirectory = None
+openTables = {} #signature -> Tablebase, or None when there is no file for it
+
+'''
+Probe the tables in directory from now on (None for no tables). Returns the largest number of pieces of
+the tables found there, 0 if there are none.
+'''
+def setDirectory(directory):
+	global tablebaseDirectory
+	for table in openTables.values():
+		if table is not None:
+			table.close()
+	openTables.clear()
+	tablebaseDirectory = directory
+	if directory is None or not os.path.isdir(directory):
+		return 0
+	pieces = [len(name) - len(FILE_EXTENSION) - 1 for name in os.listdir(directory) if name.endswith(FILE_EXTENSION)]
+	return max([count for count in pieces if count <= MAX_PIECES], default=0)
+
+def getTable(signature):
+	if signature not in openTables:
+		table = None
+		path = os.path.join(tablebaseDirectory, signature + FILE_EXTENSION) if tablebaseDirectory is not None else None
+		if path is not None and os.path.exists(path):
+			table = Tablebase(signature)
+			table.open(path)
+		openTables[signature] = table
+	return openTables[signature]
+
+'''
+Look up a position given as a list of (piece, square), e.g. ('wQ', 35). Returns (WIN, DRAW or LOSS, plies)
+for the side to move, or None when the table isn't there. Two bare kings are a draw without a table.
+'''
+def probePieces(pieces, whiteToMove, tables=None):
+	if len(pieces) == 2:
+		return DRAW, 0
+	white = [piece[1].upper() for piece, sq in pieces if piece[0] == "w"]
+	black = [piece[1].upper() for piece, sq in pieces if piece[0] == "b"]
+	signature, swapped = canonicalSignature(white, black)
+	table = tables[signature] if tables is not None else getTable(signature)
+	if table is None:
+		return None
+	squaresByPiece = {}
+	for piece, sq in pieces:
+		if swapped: #black is the stronger side: swap the colours and mirror the board top to bottom
+			piece = ("b" if piece[0] == "w" else "w") + piece[1]
+			sq = mirrorRanks(sq)
+		squaresByPiece.setdefault(piece, []).append(sq)
+	squares = [squaresByPiece[piece].pop() for piece in table.pieces]
+	return table.probe(squares, whiteToMove == swapped)
+
+'''
+Probe the position of a GameState. Returns None if there's no table for it, if it has more than MAX_PIECES
+pieces, castling rights, or an en-passant capture could be made.
+'''
+def probe(gs):
+	if tablebaseDirectory is None:
+		return None
+	rights = gs.currentCastlingRight
+	if rights.wks or rights.wqs or rights.bks or rights.bqs:
+		return None
+	pieces = []
+	for r in range(8):
+		for c in range(8):
+			piece = gs.board[r][c]
+			if piece != "--":
+				pieces.append((piece, r*8 + c))
+				if len(pieces) > MAX_PIECES:
+					return None
+	if gs.enpassantPossible != ():
+		row, col = gs.enpassantPossible
+		pawnRow = row + 1 if gs.whitetoMove else row - 1
+		pawn = "wp" if gs.whitetoMove else "bp"
+		if (col > 0 and gs.board[pawnRow][col-1] == pawn) or (col < 7 and gs.board[pawnRow][col+1] == pawn):
+			return None
+	return probePieces(pieces, gs.whitetoMove)
+
+
+attackerLists = {} #pieces of a table -> {colour: [(attack masks, piece number, slides)]}
+
+def getAttackers(pieces):
+	key = tuple(pieces)
+	if key not in attackerLists:
+		attackerLists[key] = {color: [(attackMasks[piece if piece[1] == "p" else piece[1]], i, piece[1] in "RBQ")
+									  for i, piece in enumerate(pieces) if piece[0] == color] for color in "wb"}
+	return attackerLists[key]
+
+'''
+Whether one of the attackers (a list from getAttackers) attacks target. squares is the position, captured
+the number of a piece that was just taken (-1 for none) and occupied the bitmask of the occupied squares.
+'''
+def isAttacked(target, attackers, squares, captured, occupied):
+	for masks, i, slides in attackers:
+		if i != captured:
+			sq = squares[i]
+			if masks[sq] >> target & 1 and (not slides or betweenMasks[sq*64 + target] & occupied == 0):
+				return True
+	return False
+
+'''
+Legal moves of the side to move as (piece number, target square, number of the piece taken or -1, promotes)
+'''
+def legalMoves(pieces, squares, color):
+	enemyColor = "b" if color == "w" else "w"
+	occupied = 0
+	pieceOn = {}
+	for i, sq in enumerate(squares):
+		occupied |= 1 << sq
+		pieceOn[sq] = i
+	king = pieces.index(color + "K")
+	kingSq = squares[king]
+	attackers = getAttackers(pieces)[enemyColor]
+	#only these can give check after a move of another piece than the king
+	checkers = [attacker for attacker in attackers if attacker[0][squares[attacker[1]]] >> kingSq & 1]
+	moves = []
+	for i, piece in enumerate(pieces):
+		if piece[0] != color:
+			continue
+		sq = squares[i]
+		kind = piece[1]
+		targets = []
+		if kind == "K" or kind == "N":
+			targets = stepTargets[kind][sq]
+		elif kind == "p":
+			forward = -8 if color == "w" else 8
+			if sq + forward not in pieceOn:
+				targets = [sq + forward]
+				if sq // 8 == (6 if color == "w" else 1) and sq + 2*forward not in pieceOn:
+					targets.append(sq + 2*forward)
+			targets += [target for target in pieceOn if attackMasks[piece][sq] >> target & 1 and pieces[pieceOn[target]][0] == enemyColor]
+		else:
+			for ray in slidingRays[kind][sq]:
+				for target in ray:
+					targets.append(target)
+					if target in pieceOn:
+						break
+		for target in targets:
+			captured = pieceOn.get(target, -1)
+			if captured != -1 and (pieces[captured][0] == color or pieces[captured][1] == "K"):
+				continue
+			if i == king or checkers:
+				newSquares = list(squares)
+				newSquares[i] = target
+				if isAttacked(target if i == king else kingSq, attackers if i == king else checkers, newSquares, captured,
+							  (occupied & ~(1 << sq)) | 1 << target):
+					continue
+			moves.append((i, target, captured, kind == "p" and target // 8 in (0, 7)))
+	return moves
+
+'''
+Signature of the position left after a capture and/or promotion
+'''
+def childPieces(pieces, mover, captured, promotes):
+	child = list(pieces)
+	if promotes:
+		child[mover] = child[mover][0] + "Q"
+	return [piece for i, piece in enumerate(child) if i != captured]
+
+'''
+Positions the side to move could have come from by a move of the other side that took nothing and promoted
+nothing, as lists of squares. Only the ones where the side to move wasn't in check (so it was legal) are given.
+'''
+def predecessors(pieces, squares, color):
+	enemyColor = "b" if color == "w" else "w" #the side that just moved
+	occupied = 0
+	for sq in squares:
+		occupied |= 1 << sq
+	kingSq = squares[pieces.index(color + "K")]
+	attackers = getAttackers(pieces)[enemyColor]
+	result = []
+	for i, piece in enumerate(pieces):
+		if piece[0] != enemyColor:
+			continue
+		sq = squares[i]
+		kind = piece[1]
+		origins = []
+		if kind == "K" or kind == "N":
+			origins = [origin for origin in stepTargets[kind][sq] if not occupied >> origin & 1]
+		elif kind == "p":
+			back = 8 if enemyColor == "w" else -8
+			startRow = 6 if enemyColor == "w" else 1
+			if not occupied >> (sq + back) & 1 and (sq + back) // 8 not in (0, 7):
+				origins.append(sq + back)
+				if (sq + back) // 8 + (back // 8) == startRow and not occupied >> (sq + 2*back) & 1:
+					origins.append(sq + 2*back)
+		else:
+			for ray in slidingRays[kind][sq]:
+				for origin in ray:
+					if occupied >> origin & 1:
+						break
+					origins.append(origin)
+		for origin in origins:
+			newSquares = list(squares)
+			newSquares[i] = origin
+			if not isAttacked(kingSq, attackers, newSquares, -1, (occupied & ~(1 << sq)) | 1 << origin):
+				result.append(newSquares)
+	return result
+
+'''
+Whether squares is a position the side not to move could have left: every piece on its own square, no pawn
+on the first or last rank, the kings apart and the side that just moved not in check
+'''
+def isLegalPosition(pieces, squares, colorToMove):
+	if len(set(squares)) != len(squares):
+		return False
+	for i, piece in enumerate(pieces):
+		if piece[1] == "p" and squares[i] // 8 in (0, 7):
+			return False
+	otherColor = "b" if colorToMove == "w" else "w"
+	occupied = 0
+	for sq in squares:
+		occupied |= 1 << sq
+	return not isAttacked(squares[pieces.index(otherColor + "K")], getAttackers(pieces)[colorToMove], squares, -1, occupied)
+
+
+'''
+Build the table of a signature by retrograde analysis. Mates are found first, then positions are resolved
+one ply further from mate at a time, going backwards through the moves that lead to the positions just
+resolved: a position from which a move reaches a lost one is won, a position is lost once every move from it
+reaches a won one. Captures and promotions lead to smaller tables, which are taken from subtables
+(signature -> Tablebase). Positions never resolved are draws. Returns the Tablebase, its data a bytearray.
+'''
+def buildTable(signature, subtables, log=None):
+	table = Tablebase(signature)
+	table.data = bytearray(table.size)
+	pieces = table.pieces
+	size = table.size
+	result = table.data #0 until resolved, then plies + 1
+	remaining = bytearray(size) #moves inside the table not yet known to lose
+	lossFloor = bytearray(size) #plies + 1 of the longest loss a capture or promotion leads to, 255 if one doesn't lose
+	done = bytearray(size) #predecessors already gone through
+	levels = [array('I') for plies in range(MAX_PLIES + 2)] #positions to resolve at each distance to mate
+
+	start = time.perf_counter()
+	index = 0
+	for blackToMove in (False, True):
+		color = "b" if blackToMove else "w"
+		for squares in itertools.product(table.kingSquares, *[range(64)] * (len(pieces) - 1)):
+			if not isLegalPosition(pieces, squares, color):
+				result[index] = ILLEGAL
+				done[index] = 1
+				index += 1
+				continue
+			moves = legalMoves(pieces, squares, color)
+			if len(moves) == 0:
+				if isAttacked(squares[pieces.index(color + "K")], getAttackers(pieces)["w" if blackToMove else "b"], squares, -1, sum(1 << sq for sq in squares)):
+					levels[0].append(index) #checkmate
+				else:
+					done[index] = 1 #stalemate, a draw
+			inTable = 0
+			bestWin = None
+			floor = 0
+			for mover, target, captured, promotes in moves:
+				if captured == -1 and not promotes:
+					inTable += 1
+					continue
+				childSquares = [target if i == mover else sq for i, sq in enumerate(squares)]
+				child = childPieces(pieces, mover, captured, promotes)
+				if captured != -1:
+					del childSquares[captured]
+				outcome, plies = probePieces(list(zip(child, childSquares)), blackToMove, subtables)
+				if outcome == LOSS:
+					if bestWin is None or plies + 1 < bestWin:
+						bestWin = plies + 1
+				elif outcome == DRAW:
+					floor = 255
+				elif floor != 255:
+					floor = max(floor, plies + 2)
+			remaining[index] = inTable
+			if bestWin is not None:
+				levels[bestWin].append(index)
+				floor = 255
+			elif inTable == 0 and len(moves) > 0 and floor != 255: #every move is a capture or promotion that loses
+				levels[floor - 1].append(index)
+			lossFloor[index] = floor
+			index += 1
+	if log is not None:
+		print("%s: %d positions set up in %.1fs" % (signature, size, time.perf_counter() - start), file=log)
+
+	for plies in range(MAX_PLIES + 1):
+		level = levels[plies]
+		if len(level) == 0:
+			continue
+		levels[plies] = None
+		for index in level:
+			if done[index]:
+				continue
+			if result[index] == 0:
+				result[index] = plies + 1
+			elif result[index] != plies + 1:
+				continue
+			done[index] = 1
+			blackToMove = index >= table.sideSize
+			color = "b" if blackToMove else "w"
+			squares = positionSquares(table, index)
+			for previous in predecessors(pieces, squares, color):
+				previousIndex = table.index(previous, not blackToMove)
+				if result[previousIndex] != 0:
+					continue
+				if plies % 2 == 0: #lost, every move to it wins
+					if plies + 1 > MAX_PLIES:
+						raise ValueError(signature + " has mates further than a table can hold")
+					result[previousIndex] = plies + 2
+					levels[plies + 1].append(previousIndex)
+				else: #won, one fewer way out for the positions before it
+					remaining[previousIndex] -= 1
+					if remaining[previousIndex] == 0 and lossFloor[previousIndex] != 255:
+						levels[max(plies + 1, lossFloor[previousIndex] - 1)].append(previousIndex)
+	if log is not None:
+		print("%s: done in %.1fs, longest mate %d plies" % (signature, time.perf_counter() - start,
+				max((value - 1 for value in set(result) if value != ILLEGAL and value != DRAW), default=0)), file=log)
+	return table
+
+'''
+Squares of the pieces of the position at index, white king first
+'''
+def positionSquares(table, index):
+	index %= table.sideSize
+	squares = []
+	for i in range(len(table.pieces) - 1):
+		index, sq = divmod(index, 64)
+		squares.append(sq)
+	squares.append(table.kingSquares[index])
+	squares.reverse()
+	return squares
+
+'''
+Signatures of the tables a signature's captures and promotions lead to, two bare kings left out
+'''
+def subSignatures(signature):
+	pieces = Tablebase(signature).pieces
+	signatures = set()
+	pawns = [None] + [i for i, piece in enumerate(pieces) if piece[1] == "p"]
+	for captured in [-1] + [i for i, piece in enumerate(pieces) if piece[1] != "K"]:
+		for promoted in pawns:
+			if (captured == -1 and promoted is None) or captured == promoted:
+				continue
+			child = childPieces(pieces, promoted, captured, promoted is not None)
+			if len(child) > 2:
+				signatures.add(canonicalSignature([piece[1].upper() for piece in child if piece[0] == "w"],
+												  [piece[1].upper() for piece in child if piece[0] == "b"])[0])
+	return sorted(signatures)
+
+'''
+Make the table of a signature in directory, making first the smaller tables it needs that aren't there yet
+'''
+def generateTable(signature, directory=TABLEBASE_DIR, log=sys.stdout):
+	subtables = {}
+	for subSignature in subSignatures(signature):
+		path = os.path.join(directory, subSignature + FILE_EXTENSION)
+		if not os.path.exists(path):
+			generateTable(subSignature, directory, log)
+		subtables[subSignature] = Tablebase(subSignature)
+		subtables[subSignature].open(path)
+	try:
+		table = buildTable(signature, subtables, log)
+	finally:
+		for subtable in subtables.values():
+			subtable.close()
+	os.makedirs(directory, exist_ok=True)
+	path = os.path.join(directory, signature + FILE_EXTENSION)
+	with open(path + ".tmp", "wb") as f: #a table is only there once it is complete
+		f.write(table.data)
+	os.replace(path + ".tmp", path)
+
+def main(args=None):
+	parser = argparse.ArgumentParser(description="Make or probe the endgame tablebases.")
+	commands = parser.add_subparsers(dest="command", required=True)
+	generate = commands.add_parser("generate", help="make tables")
+	generate.add_argument("signatures", nargs="*", help="material of the tables, e.g. KQvK KRvKB. Default: every table with --pieces pieces")
+	generate.add_argument("--pieces", type=int, default=3, choices=range(3, MAX_PIECES + 1), help="pieces of the tables made by default (default 3)")
+	generate.add_argument("--dir", default=TABLEBASE_DIR, help="directory of the tables (default %s)" % TABLEBASE_DIR)
+	probeCommand = commands.add_parser("probe", help="look a position and its moves up")
+	probeCommand.add_argument("--fen", required=True, help="position")
+	probeCommand.add_argument("--dir", default=TABLEBASE_DIR, help="directory of the tables (default %s)" % TABLEBASE_DIR)
+	args = parser.parse_args(args)
+
+	if args.command == "generate":
+		signatures = []
+		for signature in args.signatures or allSignatures(args.pieces):
+			if not signaturePattern.match(signature) or not 3 <= len(signature) - 1 <= MAX_PIECES:
+				parser.error("bad signature " + signature)
+			white, black = signature.split("v")
+			signatures.append(canonicalSignature(white, black)[0])
+		for signature in signatures:
+			if not os.path.exists(os.path.join(args.dir, signature + FILE_EXTENSION)):
+				generateTable(signature, args.dir)
+		return 0
+
+	gs = ChessEngine.GameState()
+	gs.loadFEN(args.fen)
+	setDirectory(args.dir)
+	result = probe(gs)
+	if result is None:
+		print("not in the tables")
+		return 1
+	print(describe(result))
+	for move in gs.getValidMoves():
+		gs.makeMove(move)
+		child = probe(gs)
+		gs.undoMove()
+		print("%-8s %s" % (gs.getSAN(move), describe((-child[0], child[1] + 1)) if child is not None else "not in the tables"))
+	return 0
+
+def describe(result):
+	outcome, plies = result
+	if outcome == DRAW:
+		return "draw"
+	return ("win" if outcome == WIN else "loss") + ", mate in %d plies" % plies
+
+if __name__ == "__main__":
+	sys.exit(main())
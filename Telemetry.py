@@ -0,0 +1,205 @@
+"""
+What the search did: every findBestMove fills a SearchStats with its node counts, cutoffs, the time and result
+of each iteration and optionally where the time went. SmartMoveFinder.telemetry is the Telemetry that keeps the
+stats of the last search, calls the subscribers after every iteration and at the end of every search, and can
+write the stats of each search as a line of JSON.
+The counters are plain integers the search updates anyway, so collecting them costs next to nothing. Timing the
+move generation and evaluation calls, cProfile and tracemalloc slow the search down and are off by default.
+"""
+import cProfile
+import functools
+import io
+import json
+import pstats
+import time
+import tracemalloc
+
+PROFILE_LINES = 25 #functions listed in the profile summary
+MEMORY_LINES = 10 #allocation sites listed in the memory summary
+
+
+'''
+Stats of one search. nodes counts all the nodes searched, quiescence ones included, and with a parallel search
+those of the helper processes too. The other counters are the main search's.
+'''
+class SearchStats():
+	def __init__(self, workers=1):
+		self.startTime = time.perf_counter()
+		self.time = 0.0 #seconds
+		self.workers = workers
+		self.bookMove = False
+		self.bestMove = None #coordinate notation
+		self.depth = 0
+		self.score = 0
+		self.nodes = 0
+		self.quiescenceNodes = 0
+		self.betaCutoffs = 0
+		self.firstMoveCutoffs = 0 #cutoffs by the first move searched, a measure of the move ordering
+		self.hashCutoffs = 0 #nodes the transposition table answered
+		self.tablebaseHits = 0
+		self.researches = 0 #moves of the principal variation search searched again after their scout failed high
+		self.aspirationFails = 0 #root searches repeated because the score fell outside the aspiration window
+		self.nullMoveCutoffs = 0
+		self.lmrResearches = 0 #late moves searched again to the full depth after the reduced search failed high
+		self.iterations = [] #dict per completed iteration
+		self.callTimes = {} #name -> [calls, seconds] of the timed calls
+		self.profile = None #pstats.Stats of the search when profiling
+		self.memory = None #dict of the memory use when tracing allocations
+
+	def nps(self):
+		return self.nodes / self.time if self.time > 0 else 0
+
+	def firstMoveCutoffRate(self):
+		return self.firstMoveCutoffs / self.betaCutoffs if self.betaCutoffs > 0 else 0
+
+	'''
+	Record an iteration that completed, counters is a dict of the search counters (see SmartMoveFinder.searchCounters)
+	'''
+	def addIteration(self, depth, score, move, counters):
+		now = time.perf_counter() - self.startTime
+		previous = self.iterations[-1] if self.iterations else {"time": 0.0, "totalNodes": 0, "totalBetaCutoffs": 0, "totalFirstMoveCutoffs": 0}
+		nodes = counters["nodes"] - previous["totalNodes"]
+		betaCutoffs = counters["betaCutoffs"] - previous["totalBetaCutoffs"]
+		firstMoveCutoffs = counters["firstMoveCutoffs"] - previous["totalFirstMoveCutoffs"]
+		iterationTime = now - previous["time"]
+		self.iterations.append({"depth": depth, "score": score, "move": move, "time": now, "iterationTime": iterationTime,
+								"nodes": nodes, "nps": nodes / iterationTime if iterationTime > 0 else 0, "betaCutoffs": betaCutoffs,
+								"firstMoveCutoffRate": firstMoveCutoffs / betaCutoffs if betaCutoffs > 0 else 0,
+								"totalNodes": counters["nodes"], "totalBetaCutoffs": counters["betaCutoffs"],
+								"totalFirstMoveCutoffs": counters["firstMoveCutoffs"]})
+		self.depth = depth
+		self.score = score
+		self.bestMove = move
+
+	'''
+	Share of the search time spent in each timed call
+	'''
+	def callShares(self):
+		return {name: seconds / self.time if self.time > 0 else 0 for name, (calls, seconds) in self.callTimes.items()}
+
+	def toDict(self):
+		stats = {"time": self.time, "workers": self.workers, "bookMove": self.bookMove, "bestMove": self.bestMove,
+				 "depth": self.depth, "score": self.score, "nodes": self.nodes, "nps": self.nps(),
+				 "quiescenceNodes": self.quiescenceNodes, "betaCutoffs": self.betaCutoffs, "firstMoveCutoffs": self.firstMoveCutoffs,
+				 "firstMoveCutoffRate": self.firstMoveCutoffRate(), "hashCutoffs": self.hashCutoffs, "tablebaseHits": self.tablebaseHits,
+				 "researches": self.researches, "aspirationFails": self.aspirationFails,
+				 "nullMoveCutoffs": self.nullMoveCutoffs, "lmrResearches": self.lmrResearches,
+				 "iterations": [{key: value for key, value in iteration.items() if not key.startswith("total")} for iteration in self.iterations]}
+		if self.callTimes:
+			shares = self.callShares()
+			stats["calls"] = {name: {"calls": calls, "time": seconds, "share": shares[name]} for name, (calls, seconds) in self.callTimes.items()}
+		if self.profile is not None:
+			stats["profile"] = profileSummary(self.profile)
+		if self.memory is not None:
+			stats["memory"] = self.memory
+		return stats
+
+	def toJSON(self, indent=None):
+		return json.dumps(self.toDict(), indent=indent)
+
+
+'''
+The functions taking the most time in a profile, as a list of dicts
+'''
+def profileSummary(profile, lines=PROFILE_LINES):
+	functions = []
+	for (filename, line, name), (primitiveCalls, calls, ownTime, totalTime, callers) in profile.stats.items():
+		functions.append({"function": "%s:%d(%s)" % (filename, line, name), "calls": calls, "ownTime": ownTime, "totalTime": totalTime})
+	functions.sort(key=lambda function: function["ownTime"], reverse=True)
+	return functions[:lines]
+
+
+class Telemetry():
+	def __init__(self, timeCalls=False, profile=False, traceMemory=False, jsonLog=None):
+		self.timeCalls = timeCalls #time the getValidMoves and scoreBoard calls of the search
+		self.profile = profile #run the search under cProfile
+		self.traceMemory = traceMemory #trace the allocations of the search with tracemalloc
+		self.jsonLog = jsonLog #file the stats of every search are appended to, one JSON object per line
+		self.subscribers = []
+		self.current = None #SearchStats of the search running
+		self.lastSearch = None #SearchStats of the last search that finished
+		self.profiler = None
+		self.startedTracing = False
+		self.timing = False #inside a timed call, calls it makes aren't timed separately
+
+	'''
+	callback(event, stats) is called with event "iteration" after every completed iteration (stats.iterations[-1]
+	is the new one) and "search" when the search is over. It runs on the searching thread.
+	'''
+	def subscribe(self, callback):
+		self.subscribers.append(callback)
+
+	def unsubscribe(self, callback):
+		self.subscribers.remove(callback)
+
+	def publish(self, event, stats):
+		for callback in self.subscribers:
+			callback(event, stats)
+
+	def startSearch(self, workers=1):
+		stats = SearchStats(workers)
+		self.current = stats
+		if self.traceMemory and not tracemalloc.is_tracing():
+			tracemalloc.start()
+			self.startedTracing = True
+		if self.traceMemory:
+			tracemalloc.reset_peak()
+		if self.profile:
+			self.profiler = cProfile.Profile()
+			self.profiler.enable()
+		return stats
+
+	def iteration(self, depth, score, move, counters):
+		stats = self.current
+		stats.addIteration(depth, score, move, counters)
+		self.publish("iteration", stats)
+
+	'''
+	counters is a dict of the final search counters, bestMove the move played in coordinate notation
+	'''
+	def endSearch(self, counters, bestMove, bookMove=False):
+		stats = self.current
+		stats.time = time.perf_counter() - stats.startTime
+		stats.bestMove = bestMove
+		stats.bookMove = bookMove
+		for name, value in counters.items():
+			setattr(stats, name, value)
+		if self.profiler is not None:
+			self.profiler.disable()
+			stats.profile = pstats.Stats(self.profiler, stream=io.StringIO())
+			self.profiler = None
+		if self.traceMemory and tracemalloc.is_tracing():
+			current, peak = tracemalloc.get_traced_memory()
+			top = tracemalloc.take_snapshot().statistics("lineno")[:MEMORY_LINES]
+			stats.memory = {"current": current, "peak": peak,
+							"top": [{"line": str(statistic.traceback[0]), "size": statistic.size, "count": statistic.count} for statistic in top]}
+			if self.startedTracing:
+				tracemalloc.stop()
+				self.startedTracing = False
+		self.current = None
+		self.lastSearch = stats
+		if self.jsonLog is not None:
+			with open(self.jsonLog, "a") as f:
+				f.write(stats.toJSON() + "\n")
+		self.publish("search", stats)
+		return stats
+
+	'''
+	Wrap function so that its calls and the time they take are added to the stats of the running search under name
+	'''
+	def timed(self, function, name):
+		@functools.wraps(function)
+		def timedFunction(*args):
+			if self.timing:
+				return function(*args)
+			self.timing = True
+			start = time.perf_counter()
+			try:
+				return function(*args)
+			finally:
+				elapsed = time.perf_counter() - start
+				self.timing = False
+				times = self.current.callTimes.setdefault(name, [0, 0.0])
+				times[0] += 1
+				times[1] += elapsed
+		return timedFunction
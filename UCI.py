@@ -0,0 +1,242 @@
+"""
+Headless front end speaking the UCI protocol on stdin/stdout, so the engine can be run by chess GUIs and
+match servers without the pygame window: python UCI.py
+Supported: uci, isready, ucinewgame, setoption (Hash, Threads, Bitboards, BookFile, TablebasePath, StatsFile),
+position startpos/fen ... moves ..., go depth/movetime/wtime/btime/winc/binc/movestogo/nodes/infinite,
+stop and quit. An info line is sent after every completed iteration of the search.
+Doesn't import pygame, only ChessEngine and SmartMoveFinder.
+"""
+import copy
+import sys
+import threading
+import time
+import ChessEngine
+import SmartMoveFinder
+
+ENGINE_NAME = "BasicChessEngine"
+ENGINE_AUTHOR = "VyomGarg47"
+MAX_HASH_MB = 1024
+MAX_THREADS = 64
+MOVES_TO_GO = 30 #moves the remaining clock time is shared over when the GUI doesn't say
+MOVE_OVERHEAD = 0.05 #seconds kept back on every move for the GUI and the pipe
+
+
+class UCIEngine():
+	def __init__(self, out=sys.stdout):
+		self.out = out
+		self.bitboards = False
+		self.gs = ChessEngine.GameState(bitboards=self.bitboards)
+		self.searchThread = None
+		self.stopRequested = threading.Event() #set by stop, an infinite search holds its bestmove back until then
+		SmartMoveFinder.telemetry.subscribe(self.searchEvent)
+
+	def send(self, line):
+		self.out.write(line + "\n")
+		self.out.flush()
+
+	'''
+	Handle one line from the GUI, returns False once it said quit
+	'''
+	def command(self, line):
+		tokens = line.split()
+		if len(tokens) == 0:
+			return True
+		name = tokens[0]
+		if name == "uci":
+			self.send("id name " + ENGINE_NAME)
+			self.send("id author " + ENGINE_AUTHOR)
+			self.send("option name Hash type spin default %d min 1 max %d" % (SmartMoveFinder.HASH_SIZE_MB, MAX_HASH_MB))
+			self.send("option name Threads type spin default %d min 1 max %d" % (SmartMoveFinder.SEARCH_WORKERS, MAX_THREADS))
+			self.send("option name Bitboards type check default false")
+			self.send("option name BookFile type string default <empty>")
+			self.send("option name TablebasePath type string default <empty>")
+			self.send("option name StatsFile type string default <empty>")
+			self.send("uciok")
+		elif name == "isready":
+			self.send("readyok")
+		elif name == "ucinewgame":
+			self.stop()
+			SmartMoveFinder.transpositionTable.clear()
+		elif name == "setoption":
+			self.stop()
+			self.setOption(tokens[1:])
+		elif name == "position":
+			self.stop()
+			self.setPosition(tokens[1:])
+		elif name == "go":
+			self.stop()
+			self.go(tokens[1:])
+		elif name == "stop":
+			self.stop()
+		elif name == "quit":
+			self.stop()
+			return False
+		return True #anything else is ignored, as the protocol asks
+
+	'''
+	setoption name <id> [value <x>]
+	'''
+	def setOption(self, tokens):
+		if "name" not in tokens:
+			return
+		valueAt = tokens.index("value") if "value" in tokens else len(tokens)
+		name = " ".join(tokens[tokens.index("name")+1:valueAt]).lower()
+		value = " ".join(tokens[valueAt+1:])
+		try:
+			if name == "hash":
+				SmartMoveFinder.setHashSize(min(max(int(value), 1), MAX_HASH_MB))
+			elif name == "threads":
+				SmartMoveFinder.setSearchWorkers(min(max(int(value), 1), MAX_THREADS)) #the helpers start now, not in the first search
+			elif name == "bitboards": #bitboard move generation, a faster search but not a faster perft, see ChessEngine.BitboardGameState
+				self.bitboards = value.lower() == "true"
+				self.gs = ChessEngine.GameState(bitboards=self.bitboards)
+			elif name == "bookfile":
+				SmartMoveFinder.setOpeningBook(None if value in ("", "<empty>") else value)
+			elif name == "tablebasepath":
+				SmartMoveFinder.setTablebasePath(None if value in ("", "<empty>") else value)
+			elif name == "statsfile": #the stats of every search are appended to it as a line of JSON
+				SmartMoveFinder.telemetry.jsonLog = None if value in ("", "<empty>") else value
+			else:
+				self.send("info string unknown option " + name)
+		except ValueError:
+			self.send("info string bad value for " + name + ": " + value)
+		except OSError as e:
+			self.send("info string can't open " + value + ": " + e.strerror)
+
+	'''
+	position startpos [moves ...] or position fen <fen> [moves ...]
+	'''
+	def setPosition(self, tokens):
+		movesAt = tokens.index("moves") if "moves" in tokens else len(tokens)
+		gs = ChessEngine.GameState(bitboards=self.bitboards)
+		try:
+			if len(tokens) > 0 and tokens[0] == "fen":
+				gs.loadFEN(" ".join(tokens[1:movesAt]))
+			elif len(tokens) == 0 or tokens[0] != "startpos":
+				self.send("info string position needs startpos or fen")
+				return
+		except ValueError as e:
+			self.send("info string " + str(e))
+			return
+		for text in tokens[movesAt+1:]:
+			move = self.findMove(gs, text)
+			if move is None:
+				self.send("info string illegal move " + text)
+				break
+			gs.makeMove(move)
+		self.gs = gs
+
+	'''
+	The valid move written as text in coordinate notation, or None. The engine only promotes to a queen,
+	a promotion to any other piece is played as one.
+	'''
+	def findMove(self, gs, text):
+		for move in gs.getValidMoves():
+			if move.getChessNotation() == text[:4]:
+				return move
+		return None
+
+	'''
+	go [depth n] [movetime ms] [wtime ms] [btime ms] [winc ms] [binc ms] [movestogo n] [nodes n] [infinite]
+	The search runs on its own thread so that stop can still be read.
+	'''
+	def go(self, tokens):
+		limits = {}
+		for i in range(len(tokens) - 1):
+			if tokens[i] in ("depth", "movetime", "wtime", "btime", "winc", "binc", "movestogo", "nodes"):
+				try:
+					limits[tokens[i]] = int(tokens[i+1])
+				except ValueError:
+					pass
+		maxDepth = limits.get("depth")
+		nodeLimit = limits.get("nodes")
+		timeLimit = None
+		if "movetime" in limits:
+			timeLimit = max(limits["movetime"] / 1000 - MOVE_OVERHEAD, 0.01)
+		else:
+			clock = limits.get("wtime" if self.gs.whitetoMove else "btime")
+			if clock is not None:
+				increment = limits.get("winc" if self.gs.whitetoMove else "binc", 0)
+				share = clock / limits.get("movestogo", MOVES_TO_GO) + increment * 0.8
+				timeLimit = max(min(share, clock - MOVE_OVERHEAD*1000) / 1000, 0.01)
+		infinite = "infinite" in tokens or (maxDepth is None and timeLimit is None and nodeLimit is None and len(tokens) > 0)
+		if infinite:
+			maxDepth = SmartMoveFinder.MAX_DEPTH #searched until stop
+		self.stopRequested.clear()
+		self.searchThread = threading.Thread(target=self.search, args=(copy.deepcopy(self.gs), maxDepth, timeLimit, nodeLimit, infinite), daemon=True)
+		self.searchThread.start()
+
+	'''
+	Runs on the search thread, sends the result and the bestmove. An infinite search can end on its own, once it
+	finds a mate or reaches MAX_DEPTH, but the protocol only allows the bestmove after stop, so it waits for it.
+	'''
+	def search(self, gs, maxDepth, timeLimit, nodeLimit, infinite=False):
+		validMoves = gs.getValidMoves()
+		if len(validMoves) == 0:
+			if infinite:
+				self.stopRequested.wait()
+			self.send("bestmove 0000")
+			return
+		start = time.perf_counter()
+		move = SmartMoveFinder.findBestMove(gs, validMoves, maxDepth, timeLimit, nodeLimit)
+		elapsed = time.perf_counter() - start
+		if SmartMoveFinder.playedBookMove:
+			self.send("info string book move")
+		else:
+			nodes = SmartMoveFinder.nodesSearched
+			self.send("info depth %d score %s nodes %d time %d nps %d" % (SmartMoveFinder.completedDepth, uciScore(SmartMoveFinder.bestScore),
+																		   nodes, elapsed*1000, nodes / elapsed if elapsed > 0 else 0))
+		if infinite:
+			self.stopRequested.wait()
+		self.send("bestmove " + uciMove(move))
+
+	'''
+	Telemetry subscriber, runs on the search thread: an info line for every iteration that completed
+	'''
+	def searchEvent(self, event, stats):
+		if event == "iteration":
+			iteration = stats.iterations[-1]
+			self.send("info depth %d score %s nodes %d time %d nps %d pv %s" % (iteration["depth"], uciScore(iteration["score"]),
+																				  iteration["totalNodes"], iteration["time"]*1000, iteration["totalNodes"] / iteration["time"] if iteration["time"] > 0 else 0, iteration["move"]))
+
+	'''
+	Stop the search if one is running and wait for it to send its bestmove
+	'''
+	def stop(self):
+		if self.searchThread is None:
+			return
+		self.stopRequested.set()
+		while self.searchThread.is_alive():
+			SmartMoveFinder.stopSearch()
+			self.searchThread.join(0.01)
+		self.searchThread = None
+
+'''
+Score of the side to move as sent in info lines: centipawns, or mate N (negative when getting mated) for a
+mate or tablebase result, both of which count the plies from the root to the mate
+'''
+def uciScore(score):
+	if abs(score) >= SmartMoveFinder.MATE_BOUND:
+		plies = round(SmartMoveFinder.CHECKMATE - abs(score))
+	elif abs(score) >= SmartMoveFinder.KNOWN_WIN:
+		plies = round(SmartMoveFinder.TABLEBASE_WIN - abs(score))
+	else:
+		return "cp %d" % round(score*100)
+	moves = max((plies + 1) // 2, 1)
+	return "mate %d" % (moves if score > 0 else -moves)
+
+'''
+Move in UCI notation, promotions get the piece they promote to
+'''
+def uciMove(move):
+	return move.getChessNotation() + ("q" if move.isPawnPromotion else "")
+
+def main():
+	engine = UCIEngine()
+	for line in sys.stdin:
+		if not engine.command(line):
+			break
+	engine.stop()
+
+if __name__ == "__main__":
+	main()